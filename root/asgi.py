@@ -3,6 +3,10 @@ ASGI config for root project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The availability stream (``spots/stream/``) keeps one connection open per
+client, so it has to be served from here, e.g.
+``gunicorn root.asgi:application -k uvicorn.workers.UvicornWorker``.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
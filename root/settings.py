@@ -68,6 +68,8 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'user.middleware.MetricsMiddleware',
+    'user.middleware.QueryInstrumentationMiddleware',
 ]
 
 ROOT_URLCONF = 'root.urls'
@@ -134,6 +136,15 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# PBKDF2 hash lari cheklangan thread poolda (user/hashing.py). Pool va QUEUE process ichida: sync gunicorn
+# workerlarida (bitta so'rov = bitta process) ular to'lmaydi, u yerda himoyani PASSWORD_HASH_SHARED_LIMIT beradi
+PASSWORD_HASH_WORKERS = None  # None - CPU yadrolari soni
+PASSWORD_HASH_QUEUE = 16  # bundan ko'p kutayotgan hash bo'lsa 503
+PASSWORD_HASH_TIMEOUT = 10  # sekund
+PASSWORD_HASH_SHARED_LIMIT = 32  # barcha workerlar bo'yicha bir vaqtdagi hashlar (shared keshda), None - o'chirilgan
+USER_IMPORT_CHUNK_SIZE = 1000  # bulk import: har chunk uchun bitta unikallik so'rovi va bitta bulk_create
+USER_SEARCH_INDEX_TTL = 300  # SQLite: profile/search xotiradagi indeksi qayta quriladi (PostgreSQL da DB indekslari)
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -166,9 +177,17 @@ REST_FRAMEWORK = {
     ],
         'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
         'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        'user.authentication.CachedJWTAuthentication',
+    ),
+    # token bucket: '10/min' - 10 ta ketma-ket urinish, keyin har 6 sekundda bittadan (user/throttling.py)
+    'DEFAULT_THROTTLE_RATES': {
+        'login': '10/min',
+        'register': '5/min',
+        'otp-send': '3/min',
+        'otp-verify': '5/min',
+    },
 }
+THROTTLE_BACKEND = 'redis'  # barcha workerlar uchun umumiy bucketlar (Lua skript); 'memory' - testlar uchun
 
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Parking Project API',
@@ -193,10 +212,78 @@ EMAIL_HOST_USER = "hoshimjonovhojiakbar008@gmail.com"
 EMAIL_HOST_PASSWORD = "sgwuuhbeecuxacmb"
 EMAIL_USE_SSL = False
 
+MAIL_QUEUE_ASYNC = True  # False - xat so'rov ichida yuboriladi
+MAIL_BATCH_SIZE = 50  # bitta SMTP sessiyada ketma-ket yuboriladigan xatlar
+MAIL_IDLE_SECONDS = 30  # navbat shuncha bo'sh tursa SMTP ulanish yopiladi
+MAIL_MAX_ATTEMPTS = 5
+MAIL_RETRY_BACKOFF = 1  # sekund, har urinishda ikki barobar
+MAIL_QUEUE_SIZE = 1000  # navbat to'lsa forgot-password 503 qaytaradi
+
 REDIS_HOST = 'localhost'
 REDIS_PORT = 6379
 REDIS_DB = 0
 
+OTP_BACKEND = 'redis'  # 'memory' - testlar uchun
+OTP_CODE_TTL = 60  # sekund
+OTP_VERIFIED_TTL = 120  # sekund, tasdiqlangandan keyin parolni o'zgartirish uchun
+
+# --------------- Cache -----------------------
+# zona keshida jonli available_spots bor: generation bump barcha workerlarga yetishi uchun umumiy Redis kesh.
+# CACHE_BACKEND=locmem (bitta process, dev) - har bir worker o'z keshida
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'redis')
+if CACHE_BACKEND == 'redis':
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': f'redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}',
+        'KEY_PREFIX': 'parking',
+    }}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+# sekund; locmem da boshqa workerlardagi o'zgarishlar shu vaqtgacha ko'rinmaydi, shuning uchun qisqa
+ZONE_CACHE_TTL = 300 if CACHE_BACKEND == 'redis' else 5
+SINGLE_FLIGHT_WAIT = 2  # sekund, boshqa so'rov qayta hisoblayotganda kutish (keyin o'zi hisoblaydi)
+SINGLE_FLIGHT_LOCK_TIMEOUT = 30  # sekund, workerlar orasidagi lock muddati
+
+# --------------- Parking zone spatial index -----------------------
+
+SPATIAL_INDEX_CELL_DEGREES = 0.01  # ~1.1 km katak
+SPATIAL_INDEX_TTL = 60  # sekund, boshqa workerlardagi zone o'zgarishlari shu vaqt ichida ko'rinadi
+
+# --------------- Spot availability bitmaps -----------------------
+
+AVAILABILITY_BACKEND = 'redis'  # barcha workerlar uchun umumiy bitmaplar; 'local' - faqat bitta process (dev, testlar)
+AVAILABILITY_TTL = 60  # sekund, faqat 'local' backend uchun
+AVAILABILITY_REDIS_TTL = 600  # sekund, 'redis' bitmaplari shu vaqtdan keyin DB dan to'liq qayta quriladi
+
+# --------------- Sensor feed -----------------------
+
+SENSOR_BATCH_SIZE = 1000  # bitta tranzaksiyada qayta ishlanadigan joylar soni
+SENSOR_DEBOUNCE_SECONDS = 2  # 0 - eventlar so'rov ichida darhol yoziladi
+SENSOR_FLUSH_SIZE = 5000  # buferda shuncha joy yig'ilsa interval kutilmaydi
+SENSOR_MAX_ATTEMPTS = 3  # shuncha flushda yozilmagan event user.ingest.dead_letter logiga tushadi
+
+# --------------- Availability push (SSE) -----------------------
+
+PUSH_BACKEND = 'redis'  # workerlar orasida pub/sub; 'memory' - faqat bitta process (testlar)
+PUSH_HEARTBEAT_SECONDS = 15
+
+# --------------- Keyset pagination -----------------------
+
+KEYSET_PAGE_SIZE = 100
+KEYSET_MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 500  # ?stream=1 eksportlarida bir martada serializatsiya qilinadigan qatorlar
+
+# --------------- SQL instrumentation -----------------------
+QUERY_INSTRUMENTATION = True  # Server-Timing: db;dur=..;desc="N queries"
+QUERY_REPEAT_THRESHOLD = 10  # bitta SQL bir so'rovda bundan ko'p bajarilsa N+1 warning
+
+# --------------- Metrics -----------------------
+# gunicorn workerlari shu papkaga <pid>.json yozadi; deploydan oldin tozalash kerak (counterlar shu yerda saqlanadi)
+METRICS_DIR = os.getenv('METRICS_DIR', join(BASE_DIR, '.metrics'))
+METRICS_FLUSH_SECONDS = 1
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')  # berilsa /metrics faqat "Authorization: Bearer <token>" bilan
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']  # token berilmagan bo'lsa faqat shu manzillardan (Prometheus shu hostda)
+
 LOGIN_URL = 'login'
 
 
@@ -243,6 +330,20 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSlidingSerializer",
 }
 
+AUTH_USER_CACHE_TTL = 60  # sekund, token egasi (User) shared keshda
+AUTH_USER_LOCAL_TTL = 5  # sekund, worker ichidagi LRU
+AUTH_USER_LOCAL_SIZE = 10000
+JWT_TRUST_ROLE_CLAIM = False  # True - IsAdmin va FK filtrlari uchun User umuman o'qilmaydi (tokendagi role)
+
+# jti bo'yicha bekor qilish: workerlar Bloom filterni xotirada saqlaydi, faqat filter "bor" desa kesh/DB tekshiriladi
+JWT_REVOCATION = True
+REVOCATION_REFRESH_SECONDS = 5  # boshqa workerda bekor qilingan token shu vaqt ichida ko'rinadi
+REVOCATION_REFRESH_MARGIN = 60  # sekund, kechikib commit bo'lgan qatorlar uchun qayta o'qiladigan oyna
+REVOCATION_REBUILD_SECONDS = 3600  # muddati o'tganlarni tashlab filterni qayta qurish
+REVOCATION_FALSE_POSITIVE_RATE = 0.01
+REVOCATION_MIN_CAPACITY = 10000
+REVOCATION_CACHE_TTL = 300
+
 
 """
 pip install whitenoise
@@ -0,0 +1,66 @@
+import random
+from functools import partial
+
+from django.db import transaction, connection
+
+from user.counters import adjust_available, status_delta, notify_changes, SpotChange
+from user.models import ParkingSpot, Reservation, version_expression
+
+# conditional UPDATE rejimida bir urinishda nechta nomzod joy olinadi
+CANDIDATES = 20
+ATTEMPTS = 3
+
+
+class NoSpotAvailable(Exception):
+    pass
+
+
+def _empty_spots(zone_id, spot_type):
+    return ParkingSpot.objects.filter(zone_id=zone_id, spot_type=spot_type, status=ParkingSpot.StatusChoices.EMPTY)
+
+
+def _claim_skip_locked(zone_id, spot_type):
+    # boshqa allocator qulflagan qatorlar o'tkazib yuboriladi - hech kim kutmaydi
+    spot = (_empty_spots(zone_id, spot_type).select_related('zone')
+            .select_for_update(skip_locked=True, of=('self',)).order_by('spot_number').first())
+    if spot is None:
+        return None
+    ParkingSpot.objects.filter(pk=spot.pk).update(status=ParkingSpot.StatusChoices.RESERVED,
+                                                  version=version_expression())
+    return spot
+
+
+def _claim_conditional(zone_id, spot_type):
+    # SQLite: SKIP LOCKED yo'q, shuning uchun "status='empty' bo'lsa" sharti bilan UPDATE qilinadi
+    for _ in range(ATTEMPTS):
+        candidates = list(_empty_spots(zone_id, spot_type).order_by('spot_number')
+                          .values_list('pk', flat=True)[:CANDIDATES])
+        if not candidates:
+            return None
+        random.shuffle(candidates)
+        for pk in candidates:
+            claimed = (ParkingSpot.objects.filter(pk=pk, status=ParkingSpot.StatusChoices.EMPTY)
+                       .update(status=ParkingSpot.StatusChoices.RESERVED, version=version_expression()))
+            if claimed:
+                return ParkingSpot.objects.select_related('zone').get(pk=pk)
+    return None
+
+
+def allocate_spot(user, zone_id, spot_type=ParkingSpot.SpotType.REGULAR):
+    claim = _claim_skip_locked if connection.features.has_select_for_update_skip_locked else _claim_conditional
+    with transaction.atomic():
+        spot = claim(zone_id, spot_type)
+        if spot is None:
+            raise NoSpotAvailable
+        spot.status = ParkingSpot.StatusChoices.RESERVED
+        # zona counteri commitdan keyin yangilanadi: tranzaksiya ichidagi UPDATE zona qatorini commitgacha qulflab,
+        # shu zonadagi barcha allocatorlarni navbatga qo'yardi. Commitdan keyin yiqilsa farqni reconcile tuzatadi
+        delta = status_delta(ParkingSpot.StatusChoices.EMPTY, spot.status)
+        transaction.on_commit(partial(adjust_available, zone_id, delta, spot.zone.shard_count), robust=True)
+        notify_changes([SpotChange(spot.pk, zone_id, spot_type, ParkingSpot.StatusChoices.EMPTY, spot.status)])
+        reservation = Reservation.objects.create(
+            user_id=user,
+            spot_id=spot,
+            status_total_amount=Reservation.StatusChoices.PENDING,
+        )
+    return spot, reservation
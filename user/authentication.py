@@ -0,0 +1,107 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from user.models import User
+from user.revocation import is_revoked
+
+
+class LocalUserCache:
+    # har bir worker ichidagi kichik LRU: shared keshga ham bormaslik uchun, TTL qisqa
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users = OrderedDict()
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.users.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.users[user_id]
+                return None
+            self.users.move_to_end(user_id)
+            return entry[1]
+
+    def set(self, user_id, user):
+        with self.lock:
+            self.users[user_id] = (time.monotonic() + getattr(settings, 'AUTH_USER_LOCAL_TTL', 5), user)
+            self.users.move_to_end(user_id)
+            while len(self.users) > getattr(settings, 'AUTH_USER_LOCAL_SIZE', 10000):
+                self.users.popitem(last=False)
+
+    def forget(self, user_id):
+        with self.lock:
+            self.users.pop(user_id, None)
+
+
+local_users = LocalUserCache()
+
+
+def _cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def forget_user(user_id):
+    local_users.forget(user_id)
+    cache.delete(_cache_key(user_id))
+
+
+def load_user(user_id):
+    user = local_users.get(user_id)
+    if user is None:
+        user = cache.get(_cache_key(user_id))
+        if user is None:
+            try:
+                user = User.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except User.DoesNotExist:
+                raise AuthenticationFailed("User not found", code='user_not_found')
+            cache.set(_cache_key(user_id), user, getattr(settings, 'AUTH_USER_CACHE_TTL', 60))
+        local_users.set(user_id, user)
+    # keshdagi obyekt so'rovlar orasida o'zgartirilmasin
+    return copy.copy(user)
+
+
+def claims_user(user_id, role):
+    # faqat id va role yuklangan User: boshqa field birinchi marta kerak bo'lganda butun qator bitta so'rovda o'qiladi
+    user = User.from_db(None, ['id', 'role'], [user_id, role])
+    user._load_deferred_together = True
+    return user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    # JWTAuthentication bilan bir xil, lekin User har so'rovda DB dan o'qilmaydi
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if is_revoked(validated_token):
+            raise InvalidToken("Token is revoked")
+        return validated_token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        role = validated_token.get('role')
+        if getattr(settings, 'JWT_TRUST_ROLE_CLAIM', False) and role is not None:
+            # token berilgandan keyingi bloklash/role o'zgarishi token muddati tugaguncha ko'rinmaydi
+            return claims_user(user_id, role)
+
+        user = load_user(user_id)
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed("User is inactive", code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed("The user's password has been changed.", code='password_changed')
+        return user
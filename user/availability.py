@@ -0,0 +1,273 @@
+import threading
+import time
+
+from django.conf import settings
+
+from user.models import ParkingSpot
+from user.redis_client import get_redis
+
+FREE_STATUS = ParkingSpot.StatusChoices.EMPTY
+
+
+def _free_spots(zone_ids=None):
+    spots = ParkingSpot.objects.filter(status=FREE_STATUS)
+    if zone_ids:
+        spots = spots.filter(zone_id__in=zone_ids)
+    return spots.order_by('id').values_list('id', 'zone_id', 'spot_type').iterator(chunk_size=5000)
+
+
+# Redis SETBIT har bir baytni eng katta bitdan boshlab to'ldiradi, Bitmap esa eng kichigidan
+REDIS_BIT_ORDER = bytes(int(f'{byte:08b}'[::-1], 2) for byte in range(256))
+
+
+def _bit_ids(base, data):
+    ids = []
+    for index, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            ids.append(base + index * 8 + low.bit_length() - 1)
+            byte ^= low
+    return ids
+
+
+class Bitmap:
+    # bit (spot_id - base) yoqilgan bo'lsa joy bo'sh; base 8 ga karrali
+    __slots__ = ('base', 'data')
+
+    def __init__(self, base):
+        self.base = base - base % 8
+        self.data = bytearray()
+
+    def _locate(self, spot_id):
+        if spot_id < self.base:
+            shift = (self.base - spot_id + 7) // 8
+            self.data[:0] = bytes(shift)
+            self.base -= shift * 8
+        offset = spot_id - self.base
+        index = offset >> 3
+        if index >= len(self.data):
+            self.data.extend(bytes(index - len(self.data) + 1))
+        return index, 1 << (offset & 7)
+
+    def set(self, spot_id, free):
+        index, mask = self._locate(spot_id)
+        if free:
+            self.data[index] |= mask
+        else:
+            self.data[index] &= ~mask
+
+    def count(self):
+        return int.from_bytes(self.data, 'little').bit_count()
+
+
+def _set_bits(maps, changes):
+    for change in changes:
+        key = (change.zone_id, change.spot_type)
+        if key not in maps:
+            maps[key] = Bitmap(change.spot_id)
+        maps[key].set(change.spot_id, change.new_status == FREE_STATUS)
+
+
+class LocalAvailability:
+    # har bir worker o'z nusxasini saqlaydi, boshqa workerlardagi o'zgarishlar AVAILABILITY_TTL dan keyin ko'rinadi,
+    # shuning uchun faqat bitta process (dev, testlar) uchun
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rebuild_lock = threading.Lock()
+        self.maps = {}
+        self.built_at = None
+        # rebuild paytida kelgan o'zgarishlar: DB skanidan keyin yangi bitmaplarga qayta qo'llanadi
+        self.pending = None
+
+    def rebuild(self):
+        with self.lock:
+            self.pending = []
+        maps = {}
+        try:
+            for spot_id, zone_id, spot_type in _free_spots():
+                key = (zone_id, spot_type)
+                if key not in maps:
+                    maps[key] = Bitmap(spot_id)
+                maps[key].set(spot_id, True)
+        except Exception:
+            with self.lock:
+                self.pending = None
+            raise
+        with self.lock:
+            _set_bits(maps, self.pending)
+            self.pending = None
+            self.maps = maps
+            self.built_at = time.monotonic()
+
+    def _ensure(self):
+        if self.built_at is not None and time.monotonic() - self.built_at < getattr(settings, 'AVAILABILITY_TTL', 60):
+            return
+        # bir vaqtda faqat bitta thread qayta quradi; eski bitmaplar bor bo'lsa qolganlar ular bilan ishlaydi
+        if not self.rebuild_lock.acquire(blocking=self.built_at is None):
+            return
+        try:
+            if self.built_at is None or time.monotonic() - self.built_at >= getattr(settings, 'AVAILABILITY_TTL', 60):
+                self.rebuild()
+        finally:
+            self.rebuild_lock.release()
+
+    def apply(self, changes):
+        with self.lock:
+            if self.pending is not None:
+                self.pending.extend(changes)
+            if self.built_at is not None:
+                _set_bits(self.maps, changes)
+
+    def drop_zone(self, zone_id):
+        with self.lock:
+            for key in [key for key in self.maps if key[0] == zone_id]:
+                del self.maps[key]
+
+    def _bitmaps(self, zone_id=None, spot_type=None):
+        self._ensure()
+        with self.lock:
+            return [(key, bitmap.base, bytes(bitmap.data)) for key, bitmap in self.maps.items()
+                    if (zone_id is None or key[0] == zone_id) and (spot_type is None or key[1] == spot_type)]
+
+    def ids(self, zone_id=None, spot_type=None):
+        ids = []
+        for _, base, data in self._bitmaps(zone_id, spot_type):
+            ids.extend(_bit_ids(base, data))
+        return ids
+
+    def counts(self, zone_id):
+        self._ensure()
+        with self.lock:
+            return {spot_type: bitmap.count() for (zone, spot_type), bitmap in self.maps.items() if zone == zone_id}
+
+
+class RedisAvailability:
+    # barcha gunicorn workerlari uchun umumiy bitmaplar: avail:<zone>:<type> (+ :base), avail:zones, avail:types:<zone>
+    PREFIX = 'avail'
+
+    def __init__(self):
+        self.redis = get_redis()
+
+    def _key(self, zone_id, spot_type):
+        return f'{self.PREFIX}:{zone_id}:{spot_type}'
+
+    def rebuild(self, zone_ids=None):
+        built = zone_ids is None
+        maps = {}
+        for spot_id, zone_id, spot_type in _free_spots(zone_ids):
+            key = (zone_id, spot_type)
+            if key not in maps:
+                maps[key] = Bitmap(spot_id)
+            maps[key].set(spot_id, True)
+
+        if zone_ids is None:
+            zone_ids = [int(zone_id) for zone_id in self.redis.smembers(f'{self.PREFIX}:zones')]
+            zone_ids = set(zone_ids) | {zone_id for zone_id, _ in maps}
+        pipe = self.redis.pipeline()
+        for zone_id in zone_ids:
+            for spot_type in ParkingSpot.SpotType.values:
+                pipe.delete(self._key(zone_id, spot_type), f'{self._key(zone_id, spot_type)}:base')
+            pipe.delete(f'{self.PREFIX}:types:{zone_id}')
+        if built:
+            # o'chirilgan zonalar ro'yxatda qolmasin
+            pipe.delete(f'{self.PREFIX}:zones')
+        for (zone_id, spot_type), bitmap in maps.items():
+            key = self._key(zone_id, spot_type)
+            pipe.set(key, bytes(bitmap.data).translate(REDIS_BIT_ORDER))
+            pipe.set(f'{key}:base', bitmap.base)
+            pipe.sadd(f'{self.PREFIX}:types:{zone_id}', spot_type)
+            pipe.sadd(f'{self.PREFIX}:zones', zone_id)
+        if built:
+            # TTL tugagach keyingi o'qishda to'liq rebuild: o'tkazib yuborilgan eventlar va o'chirilgan joylar tuzaladi
+            pipe.set(f'{self.PREFIX}:built', 1, ex=getattr(settings, 'AVAILABILITY_REDIS_TTL', 600))
+        pipe.execute()
+
+    def _ensure(self):
+        if self.redis.exists(f'{self.PREFIX}:built'):
+            return
+        # workerlar orasida bitta rebuild: qolganlari lock bo'shashini kutadi
+        lock = self.redis.lock(f'{self.PREFIX}:rebuild', timeout=getattr(settings, 'SINGLE_FLIGHT_LOCK_TIMEOUT', 30),
+                               blocking_timeout=getattr(settings, 'SINGLE_FLIGHT_WAIT', 2))
+        acquired = lock.acquire()
+        try:
+            if not self.redis.exists(f'{self.PREFIX}:built'):
+                self.rebuild()
+        finally:
+            if acquired:
+                lock.release()
+
+    def apply(self, changes):
+        # _ensure yo'q: bitmaplar hali qurilmagan bo'lsa yozilgan bitlarni birinchi o'qishdagi rebuild almashtiradi
+        keys = [self._key(change.zone_id, change.spot_type) for change in changes]
+        bases = self.redis.mget([f'{key}:base' for key in keys])
+        if None in bases:
+            pipe = self.redis.pipeline()
+            for change, key, base in zip(changes, keys, bases):
+                if base is None:
+                    pipe.set(f'{key}:base', change.spot_id - change.spot_id % 8, nx=True)
+                    pipe.sadd(f'{self.PREFIX}:types:{change.zone_id}', change.spot_type)
+                    pipe.sadd(f'{self.PREFIX}:zones', change.zone_id)
+            pipe.execute()
+            bases = self.redis.mget([f'{key}:base' for key in keys])
+
+        pipe = self.redis.pipeline()
+        rebuild = set()
+        for change, key, base in zip(changes, keys, bases):
+            if change.spot_id < int(base):
+                # base dan kichik id faqat joy boshqa zonadan ko'chirilganda paydo bo'ladi
+                rebuild.add(change.zone_id)
+                continue
+            pipe.setbit(key, change.spot_id - int(base), int(change.new_status == FREE_STATUS))
+        pipe.execute()
+        if rebuild:
+            self.rebuild(rebuild)
+
+    def drop_zone(self, zone_id):
+        pipe = self.redis.pipeline()
+        for spot_type in ParkingSpot.SpotType.values:
+            pipe.delete(self._key(zone_id, spot_type), f'{self._key(zone_id, spot_type)}:base')
+        pipe.delete(f'{self.PREFIX}:types:{zone_id}')
+        pipe.srem(f'{self.PREFIX}:zones', zone_id)
+        pipe.execute()
+
+    def _keys(self, zone_id=None, spot_type=None):
+        zone_ids = [zone_id] if zone_id is not None else [
+            int(zone) for zone in self.redis.smembers(f'{self.PREFIX}:zones')]
+        pipe = self.redis.pipeline()
+        for zone in zone_ids:
+            pipe.smembers(f'{self.PREFIX}:types:{zone}')
+        return [self._key(zone, spot_kind.decode()) for zone, spot_types in zip(zone_ids, pipe.execute())
+                for spot_kind in spot_types if spot_type is None or spot_kind.decode() == spot_type]
+
+    def ids(self, zone_id=None, spot_type=None):
+        self._ensure()
+        keys = self._keys(zone_id, spot_type)
+        pipe = self.redis.pipeline()
+        for key in keys:
+            pipe.get(key)
+            pipe.get(f'{key}:base')
+        values = pipe.execute()
+        ids = []
+        for data, base in zip(values[::2], values[1::2]):
+            ids.extend(_bit_ids(int(base or 0), (data or b'').translate(REDIS_BIT_ORDER)))
+        return ids
+
+    def counts(self, zone_id):
+        self._ensure()
+        keys = self._keys(zone_id)
+        pipe = self.redis.pipeline()
+        for key in keys:
+            pipe.bitcount(key)
+        return {key.rsplit(':', 1)[1]: count for key, count in zip(keys, pipe.execute())}
+
+
+_availability = None
+
+
+def get_availability():
+    global _availability
+    if _availability is None:
+        backend = getattr(settings, 'AVAILABILITY_BACKEND', 'redis')
+        _availability = RedisAvailability() if backend == 'redis' else LocalAvailability()
+    return _availability
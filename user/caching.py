@@ -0,0 +1,121 @@
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.http import parse_etags
+
+from user.renderers import FastJSONRenderer
+
+
+class SingleFlight:
+    # bitta process ichida: bir kalit uchun faqat bitta thread hisoblaydi, qolganlari natijasini kutadi
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, compute, stale=None, wait=None):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = {'event': threading.Event()}
+        if not leader:
+            # stale-while-revalidate: eski qiymat bo'lsa kutib o'tirmaymiz
+            if stale is not None:
+                return stale
+            if call['event'].wait(wait if wait is not None else getattr(settings, 'SINGLE_FLIGHT_WAIT', 2)):
+                if 'error' in call:
+                    raise call['error']
+                return call['result']
+            return compute()
+        try:
+            call['result'] = compute()
+            return call['result']
+        except Exception as exc:
+            call['error'] = exc
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call['event'].set()
+
+
+flight = SingleFlight()
+
+
+@contextmanager
+def cache_lock(key, timeout=None):
+    # workerlar orasida: cache.add atomar (Redis backendda SET NX), olinmasa False qaytadi
+    timeout = timeout or getattr(settings, 'SINGLE_FLIGHT_LOCK_TIMEOUT', 30)
+    acquired = cache.add(f'{key}:lock', 1, timeout)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            cache.delete(f'{key}:lock')
+
+
+def _generation_key(namespace):
+    return f'{namespace}:generation'
+
+
+def invalidate(namespace):
+    # eski yozuvlar o'chirilmaydi - generation oshadi va ular keyingi o'qishda miss bo'ladi
+    try:
+        cache.incr(_generation_key(namespace))
+    except ValueError:
+        cache.set(_generation_key(namespace), time.time_ns(), None)
+
+
+def cached_json(namespace, key, build, timeout=None):
+    # generation va yozuv bitta get_many bilan olinadi; build() paytida invalidate bo'lsa
+    # yozuv eski generation bilan saqlanadi va keyingi o'qishda qayta quriladi
+    generation_key = _generation_key(namespace)
+    values = cache.get_many([generation_key, key])
+    generation = values.get(generation_key)
+    if generation is None:
+        cache.add(generation_key, time.time_ns(), None)
+        generation = cache.get(generation_key)
+
+    entry = values.get(key)
+    if entry is None or entry[0] != generation:
+        stale = entry[1:] if entry is not None else None
+        return flight.do(key, lambda: _rebuild(key, generation, build, stale, timeout), stale=stale)
+    return entry[1], entry[2]
+
+
+def _rebuild(key, generation, build, stale, timeout):
+    with cache_lock(key) as acquired:
+        if not acquired:
+            # boshqa worker qurayapti: eski qiymat bo'lsa shuni, bo'lmasa yangisini qisqa kutamiz
+            if stale is not None:
+                return stale
+            deadline = time.monotonic() + getattr(settings, 'SINGLE_FLIGHT_WAIT', 2)
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                entry = cache.get(key)
+                if entry is not None and entry[0] == generation:
+                    return entry[1], entry[2]
+
+        body = FastJSONRenderer().render(build())
+        entry = (generation, f'"{hashlib.sha1(body).hexdigest()}"', body)
+        if timeout is None:
+            timeout = getattr(settings, 'ZONE_CACHE_TTL', 300)
+        cache.set(key, entry, timeout)
+        return entry[1], entry[2]
+
+
+def etag_response(request, etag, body):
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponse(status=304)
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    # mijoz har safar ETag bilan tekshiradi, o'zgarmagan bo'lsa 304
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,61 @@
+from django.db import connection
+from django.db.models import Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from user.counters import with_live_counters
+from user.models import ParkingSpot, ParkingZone, ZoneCounterShard, ChangeTombstone
+
+
+def safe_version():
+    # PostgreSQL: versiya = txid; snapshot xmin dan kichik txid li tranzaksiyalar tugagan, shuning uchun
+    # cursor undan oshmasa, keyin commit bo'ladigan kichikroq versiya feed dan tushib qolmaydi
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+        return cursor.fetchone()[0]
+
+
+def _zone_queryset(since):
+    # zona shard orqali o'zgargan bo'lsa (available delta), uning feed versiyasi eng yangi shard versiyasi
+    shard_version = (ZoneCounterShard.objects.filter(zone=OuterRef('pk')).order_by()
+                     .values('zone').annotate(latest=Max('version')).values('latest'))
+    changed_shards = ZoneCounterShard.objects.filter(version__gt=since).values('zone_id')
+    return (with_live_counters(ParkingZone.objects.filter(Q(version__gt=since) | Q(pk__in=changed_shards)))
+            .annotate(feed_version=Greatest('version', Coalesce(Subquery(shard_version), 0))))
+
+
+def _streams(since, watermark):
+    streams = {
+        'spots': (ParkingSpot.objects.filter(version__gt=since), 'version'),
+        'zones': (_zone_queryset(since).filter(feed_version__gt=since), 'feed_version'),
+        'deleted': (ChangeTombstone.objects.filter(version__gt=since), 'version'),
+    }
+    if watermark is not None:
+        streams = {name: (queryset.filter(**{f'{field}__lt': watermark}), field)
+                   for name, (queryset, field) in streams.items()}
+    return streams
+
+
+def _rows(rows, field):
+    for row in rows:
+        row.version = getattr(row, field)
+    return rows
+
+
+def changes_since(since, limit):
+    streams = _streams(since, safe_version())
+    pages = {name: _rows(list(queryset.order_by(field, 'id')[:limit]), field)
+             for name, (queryset, field) in streams.items()}
+
+    full = [rows[-1].version for rows in pages.values() if len(rows) == limit]
+    if not full:
+        versions = [row.version for rows in pages.values() for row in rows]
+        return pages, max(versions, default=since), False
+
+    # bitta versiyani bir nechta qator bo'lishishi mumkin (bulk yozuvlar) - guruh sahifalar orasida bo'linmaydi
+    cutoff = min(full)
+    for name, (queryset, field) in streams.items():
+        pages[name] = ([row for row in pages[name] if row.version < cutoff]
+                       + _rows(list(queryset.filter(**{field: cutoff}).order_by('id')), field))
+    return pages, cutoff, True
@@ -0,0 +1,164 @@
+import logging
+import random
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models import F, Count, Sum, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from user.caching import invalidate
+from user.models import ParkingZone, ParkingSpot, ZoneCounterShard, next_version, version_expression
+from user.signals import spot_status_changed
+
+logger = logging.getLogger(__name__)
+
+# ParkingZone.available_spots faqat 'empty' holatdagi joylarni sanaydi
+FREE_STATUS = ParkingSpot.StatusChoices.EMPTY
+
+# old_status/new_status None - joy shu (zone, spot_type) juftligida yo'q edi / endi yo'q
+SpotChange = namedtuple('SpotChange', 'spot_id zone_id spot_type old_status new_status')
+
+
+def notify_changes(changes):
+    if changes:
+        transaction.on_commit(lambda: spot_status_changed.send(sender=ParkingSpot, changes=changes), robust=True)
+
+
+def spots_created(spots):
+    notify_changes([SpotChange(spot.pk, spot.zone_id, spot.spot_type, None, spot.status) for spot in spots if spot.pk])
+
+
+def status_delta(old_status, new_status):
+    return int(new_status == FREE_STATUS) - int(old_status == FREE_STATUS)
+
+
+def _adjust_shard(zone_id, shard_count, delta):
+    slot = random.randrange(shard_count)
+    shards = ZoneCounterShard.objects.filter(zone_id=zone_id, slot=slot)
+    # versiya zona qatoriga emas, shardga yoziladi - aks holda sharding bergan parallelizm yo'qoladi
+    if not shards.update(delta=F('delta') + delta, version=version_expression()):
+        # slot hali yaratilmagan - parallel yozuvchilar bilan to'qnashmaslik uchun ON CONFLICT DO NOTHING
+        ZoneCounterShard.objects.bulk_create([ZoneCounterShard(zone_id=zone_id, slot=slot)], ignore_conflicts=True)
+        shards.update(delta=F('delta') + delta, version=version_expression())
+
+
+def adjust_available(zone_id, delta, shard_count=None):
+    if not delta:
+        return
+    if shard_count is None:
+        shard_count = ParkingZone.objects.filter(pk=zone_id).values_list('shard_count', flat=True).first()
+    if shard_count:
+        _adjust_shard(zone_id, shard_count, delta)
+        return
+    queryset = ParkingZone.objects.filter(pk=zone_id)
+    if delta >= 0:
+        queryset.update(available_spots=F('available_spots') + delta, version=version_expression())
+        return
+    if not queryset.filter(available_spots__gte=-delta).update(available_spots=F('available_spots') + delta,
+                                                               version=version_expression()):
+        # counter manfiy bo'lmaydi: 0 da to'xtatiladi, farq logga yoziladi va reconcile tuzatadi
+        if queryset.update(available_spots=0, version=version_expression()):
+            logger.warning("Zona %s counteri drift: available_spots %s ga kamaytirib bo'lmadi, 0 qo'yildi",
+                           zone_id, delta)
+
+
+def change_spot_status(spot, new_status):
+    with transaction.atomic():
+        old_status, spot_type, shard_count = (ParkingSpot.objects.select_for_update(of=('self',))
+                                              .values_list('status', 'spot_type', 'zone__shard_count').get(pk=spot.pk))
+        if old_status != new_status:
+            ParkingSpot.objects.filter(pk=spot.pk).update(status=new_status, version=version_expression())
+            adjust_available(spot.zone_id, status_delta(old_status, new_status), shard_count)
+            notify_changes([SpotChange(spot.pk, spot.zone_id, spot_type, old_status, new_status)])
+    spot.status = new_status
+    return spot
+
+
+def relocate_spot(spot, old_zone_id, old_spot_type):
+    if (spot.zone_id, spot.spot_type) == (old_zone_id, old_spot_type):
+        return
+    with transaction.atomic():
+        if spot.zone_id != old_zone_id and spot.status == FREE_STATUS:
+            adjust_available(old_zone_id, -1)
+            adjust_available(spot.zone_id, 1)
+        notify_changes([
+            SpotChange(spot.pk, old_zone_id, old_spot_type, spot.status, None),
+            SpotChange(spot.pk, spot.zone_id, spot.spot_type, None, spot.status),
+        ])
+
+
+def with_live_counters(queryset):
+    pending = (ZoneCounterShard.objects.filter(zone=OuterRef('pk')).order_by()
+               .values('zone').annotate(total=Sum('delta')).values('total'))
+    return queryset.annotate(pending_available=Coalesce(Subquery(pending), 0))
+
+
+def fold_zone_shards(zone_ids=None):
+    zones = ParkingZone.objects.filter(counter_shards__isnull=False).distinct()
+    if zone_ids:
+        zones = zones.filter(pk__in=zone_ids)
+
+    folded = []
+    for zone_id in zones.values_list('pk', flat=True):
+        with transaction.atomic():
+            zone = ParkingZone.objects.select_for_update().only('id', 'available_spots').get(pk=zone_id)
+            shards = ZoneCounterShard.objects.select_for_update().filter(zone_id=zone_id).exclude(delta=0)
+            total = sum(shards.values_list('delta', flat=True))
+            if not total:
+                continue
+            shards.update(delta=0)
+            zone.available_spots = max(zone.available_spots + total, 0)
+            ParkingZone.objects.filter(pk=zone_id).update(available_spots=zone.available_spots,
+                                                          version=version_expression())
+            folded.append(zone)
+    if folded:
+        # update() post_save yubormaydi
+        invalidate('zones')
+    return folded
+
+
+def set_zone_shards(zone, shard_count):
+    with transaction.atomic():
+        ParkingZone.objects.filter(pk=zone.pk).update(shard_count=shard_count)
+        zone.shard_count = shard_count
+        ZoneCounterShard.objects.bulk_create(
+            [ZoneCounterShard(zone=zone, slot=slot) for slot in range(shard_count)], ignore_conflicts=True
+        )
+    if not shard_count:
+        # sharding o'chirilganda qolgan deltalar zonaga qo'shiladi
+        fold_zone_shards([zone.pk])
+    return zone
+
+
+def reconcile_zone_counters(zone_ids=None):
+    spots = ParkingSpot.objects.filter(status=FREE_STATUS)
+    zones = ParkingZone.objects.only('id', 'available_spots', 'total_spots')
+    shards = ZoneCounterShard.objects.all()
+    if zone_ids:
+        spots = spots.filter(zone_id__in=zone_ids)
+        zones = zones.filter(pk__in=zone_ids)
+        shards = shards.filter(zone_id__in=zone_ids)
+
+    with transaction.atomic():
+        # avval zona va shard qatorlari qulflanadi: parallel F() update va shard yozuvlari commit bo'lishini kutadi,
+        # shuning uchun sanash va deltalarni nollash orasida hech narsa yo'qolmaydi
+        locked = list(zones.select_for_update().order_by('pk'))
+        shard_ids = list(shards.select_for_update().order_by('pk').values_list('pk', flat=True))
+        counts = dict(spots.order_by().values_list('zone_id').annotate(total=Count('id')))
+        changed = []
+        for zone in locked:
+            # bo'sh joylar total_spots dan oshmaydi (admin total_spots ni kamaytirgan bo'lishi mumkin)
+            actual = min(counts.get(zone.pk, 0), zone.total_spots)
+            if zone.available_spots != actual:
+                zone.available_spots = actual
+                changed.append(zone)
+        if changed:
+            version = next_version()
+            for zone in changed:
+                zone.version = version
+        ParkingZone.objects.bulk_update(changed, ['available_spots', 'version'], batch_size=500)
+        ZoneCounterShard.objects.filter(pk__in=shard_ids).exclude(delta=0).update(delta=0)
+    if changed:
+        # bulk_update post_save yubormaydi
+        invalidate('zones')
+    return changed
@@ -0,0 +1,95 @@
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import fields as drf_fields
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+
+# DB dan kelgan qiymat javobda o'zgarmaydigan fieldlar - ular uchun to_representation chaqirilmaydi
+IDENTITY_FIELDS = (
+    drf_fields.CharField, drf_fields.ChoiceField, drf_fields.IntegerField, drf_fields.FloatField,
+    drf_fields.BooleanField, drf_fields.ReadOnlyField, PrimaryKeyRelatedField,
+)
+
+
+class FieldPlan:
+    # serializer fieldlari bir marta tahlil qilinadi: (javobdagi nom, values() lookup, konvertor)
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.lookups = [lookup for _, lookup, _ in columns]
+
+    def values(self, queryset, *extra):
+        # extra - masalan keyset pagination kalitlari, javobga chiqmaydi
+        return queryset.values(*self.lookups, *[name for name in extra if name not in self.lookups])
+
+    def represent(self, rows):
+        columns = self.columns
+        if all(convert is None for _, _, convert in columns):
+            return [{name: row[lookup] for name, lookup, _ in columns} for row in rows]
+        return [
+            {name: row[lookup] if convert is None or row[lookup] is None else convert(row[lookup])
+             for name, lookup, convert in columns}
+            for row in rows
+        ]
+
+
+def _column(model, name, field):
+    source = field.source
+    if source == '*' or '.' in source or isinstance(field, drf_fields.SerializerMethodField):
+        return None
+    try:
+        model_field = model._meta.get_field(source)
+    except FieldDoesNotExist:
+        # property yoki annotatsiya - oddiy serializer orqali
+        return None
+    if not model_field.concrete:
+        return None
+
+    if isinstance(field, PrimaryKeyRelatedField):
+        convert = field.pk_field.to_representation if field.pk_field is not None else None
+    elif isinstance(field, IDENTITY_FIELDS):
+        convert = None
+    elif isinstance(field, drf_fields.Field) and not hasattr(field, 'fields'):
+        convert = field.to_representation
+    else:
+        return None
+    return name, model_field.attname, convert
+
+
+@lru_cache(maxsize=None)
+def compile_serializer(serializer_class):
+    # faqat o'qish uchun: ModelSerializer field mashinasini har qatorda ishga tushirmaslik.
+    # Tahlil qilib bo'lmaydigan serializer uchun None qaytadi
+    model = serializer_class.Meta.model
+    columns = []
+    for name, field in serializer_class().fields.items():
+        if field.write_only:
+            continue
+        column = _column(model, name, field)
+        if column is None:
+            return None
+        columns.append(column)
+    return FieldPlan(columns)
+
+
+def serialize_rows(queryset, serializer_class):
+    plan = compile_serializer(serializer_class)
+    if plan is None:
+        return serializer_class(queryset, many=True).data
+    return plan.represent(plan.values(queryset))
+
+
+class CompiledListMixin:
+    # ListAPIView uchun: list() model obyektlari o'rniga .values() qatorlarini serializatsiya qiladi
+
+    def list(self, request, *args, **kwargs):
+        plan = compile_serializer(self.get_serializer_class())
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+        ordering = [name.lstrip('-') for name in getattr(self, 'ordering', None) or ()]
+        queryset = plan.values(self.filter_queryset(self.get_queryset()), *ordering)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(plan.represent(page))
+        return Response(plan.represent(queryset))
@@ -0,0 +1,104 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, verify_password
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class HashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Server band, birozdan keyin qayta urinib ko'ring."
+    default_code = 'hashing_busy'
+
+
+class SharedSlots:
+    # barcha processlar uchun umumiy hisoblagich shared keshda (CACHE_BACKEND='redis'): sync gunicorn workerlarida
+    # har process bitta so'rov bajaradi, process ichidagi semafor u yerda hech qachon to'lmaydi.
+    # Process yiqilsa ushlangan slotlar kalit TTL i tugaganda qaytadi
+    key = 'hashing:slots'
+
+    def __init__(self, limit, ttl):
+        self.limit = limit
+        self.ttl = ttl
+
+    def acquire(self):
+        cache.add(self.key, 0, self.ttl)
+        try:
+            count = cache.incr(self.key)
+        except ValueError:
+            # kalit shu orada eskirdi
+            cache.add(self.key, 1, self.ttl)
+            return True
+        if count > self.limit:
+            self.release()
+            return False
+        return True
+
+    def release(self):
+        try:
+            cache.decr(self.key)
+        except ValueError:
+            pass
+
+
+class HashingExecutor:
+    # PBKDF2 uchun cheklangan pool: bir vaqtda workers ta hash, navbatda max_pending tagacha, undan ko'pi darhol 503;
+    # shared_limit berilsa butun deployment bo'yicha ham shu sondan ko'p hash bir vaqtda bajarilmaydi
+
+    def __init__(self, workers, max_pending, timeout, shared_limit=None):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self.slots = threading.BoundedSemaphore(workers + max_pending)
+        self.shared = SharedSlots(shared_limit, timeout * 2) if shared_limit else None
+        self.timeout = timeout
+
+    def _release(self):
+        self.slots.release()
+        if self.shared is not None:
+            self.shared.release()
+
+    def run(self, func, *args):
+        if not self.slots.acquire(blocking=False):
+            raise HashingBusy()
+        if self.shared is not None and not self.shared.acquire():
+            self.slots.release()
+            raise HashingBusy()
+        try:
+            future = self.pool.submit(func, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            # navbatda turgan bo'lsa bekor qilinadi; 500 o'rniga 503 - mijoz keyinroq qayta urinadi
+            future.cancel()
+            raise HashingBusy()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_hashing_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = HashingExecutor(getattr(settings, 'PASSWORD_HASH_WORKERS', None) or os.cpu_count() or 2,
+                                        getattr(settings, 'PASSWORD_HASH_QUEUE', 16),
+                                        getattr(settings, 'PASSWORD_HASH_TIMEOUT', 10),
+                                        getattr(settings, 'PASSWORD_HASH_SHARED_LIMIT', None))
+        return _executor
+
+
+def hash_password(raw_password):
+    return get_hashing_executor().run(make_password, raw_password)
+
+
+def check_hashed_password(raw_password, encoded):
+    # (to'g'rimi, hash yangilanishi kerakmi) - login tekshiruvi ham shu cheklangan pool orqali
+    return get_hashing_executor().run(verify_password, raw_password, encoded)
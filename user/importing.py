@@ -0,0 +1,86 @@
+from collections import Counter
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction, IntegrityError
+from django.db.models import Q
+
+from user.models import User
+
+UNIQUE_FIELDS = ('username', 'email', 'phone')
+MAX_REPORTED_ERRORS = 100
+
+
+def taken_values(**values):
+    # username/email/phone bo'yicha band qiymatlar bitta so'rov bilan: {'username': {...}, 'email': {...}, ...}
+    query = Q()
+    for field, items in values.items():
+        items = [item for item in items if item]
+        if items:
+            query |= Q(**{f'{field}__in': items})
+    taken = {field: set() for field in values}
+    if not query:
+        return taken
+    for row in User.objects.filter(query).values_list(*values):
+        for field, value in zip(values, row):
+            taken[field].add(value)
+    return taken
+
+
+def _new_users(valid, stats):
+    taken = taken_values(**{field: [data.get(field) for _, data in valid] for field in UNIQUE_FIELDS})
+    seen = {field: set() for field in UNIQUE_FIELDS}
+    users = []
+    for _, data in valid:
+        values = {field: data.get(field) for field in UNIQUE_FIELDS if data.get(field)}
+        if any(value in taken[field] or value in seen[field] for field, value in values.items()):
+            stats['duplicate'] += 1
+            continue
+        for field, value in values.items():
+            seen[field].add(value)
+        user = User(**data)
+        # parolni haydovchi forgot-password orqali o'rnatadi; minglab PBKDF2 hash importni soatlab cho'zardi
+        user.set_unusable_password()
+        users.append(user)
+    return users
+
+
+def _create_chunk(valid, stats):
+    for attempt in range(2):
+        chunk_stats = Counter()
+        users = _new_users(valid, chunk_stats)
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(users, batch_size=500)
+        except IntegrityError:
+            # shu orada kimdir ro'yxatdan o'tdi - tekshiruv bir marta qayta qilinadi
+            if attempt:
+                raise
+            continue
+        stats.update(chunk_stats)
+        stats['created'] += len(users)
+        return
+
+
+def import_users(rows, chunk_size=None):
+    from user.serializers import UserImportSerializer
+
+    chunk_size = chunk_size or getattr(settings, 'USER_IMPORT_CHUNK_SIZE', 1000)
+    stats, errors = Counter(created=0, duplicate=0, invalid=0), []
+    rows, line = iter(rows), 0
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        valid = []
+        for row in chunk:
+            line += 1
+            serializer = UserImportSerializer(data=row)
+            if serializer.is_valid():
+                valid.append((line, serializer.validated_data))
+                continue
+            stats['invalid'] += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({'row': line, 'errors': serializer.errors})
+        _create_chunk(valid, stats)
+    return dict(stats, errors=errors)
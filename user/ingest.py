@@ -0,0 +1,212 @@
+import atexit
+import json
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction, close_old_connections, OperationalError, InterfaceError
+from django.db.models import Q
+
+from user.counters import adjust_available, notify_changes, status_delta, SpotChange
+from user.models import ParkingSpot, version_expression
+
+STATUSES = set(ParkingSpot.StatusChoices.values)
+MAX_ZONE_ID = 2 ** 63 - 1  # BigAutoField chegarasi: undan kattasi bazada xato beradi
+
+# ulanish/lock xatolari: chunk butunligicha keyingi flushda qayta uriniladi
+TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+
+logger = logging.getLogger(__name__)
+dead_letter = logging.getLogger('user.ingest.dead_letter')
+
+
+def _latest_statuses(events, stats):
+    # bir joy uchun bir nechta event kelsa oxirgisi qoladi
+    latest = {}
+    for event in events:
+        try:
+            key = (int(event['zone']), str(event['spot_number']))
+            status = event['status']
+        except (KeyError, TypeError, ValueError):
+            stats['invalid'] += 1
+            continue
+        if not 0 < key[0] <= MAX_ZONE_ID or not isinstance(status, str) or status not in STATUSES:
+            stats['invalid'] += 1
+            continue
+        latest[key] = status
+    return latest
+
+
+def _spot_pairs(latest):
+    # faqat kelgan (zone, spot_number) juftliklari: zone_id__in & spot_number__in boshqa zonadagi
+    # bir xil raqamli joylarni ham olib qulflab qo'yardi
+    numbers = defaultdict(list)
+    for zone_id, spot_number in latest:
+        numbers[zone_id].append(spot_number)
+    query = Q()
+    for zone_id, spot_numbers in numbers.items():
+        query |= Q(zone_id=zone_id, spot_number__in=spot_numbers)
+    return query
+
+
+def _apply_chunk(latest, stats):
+    with transaction.atomic():
+        # (zone, spot_number) unique_together bo'yicha bitta so'rov; id tartibida qulflash deadlockning oldini oladi
+        spots = (ParkingSpot.objects.select_for_update()
+                 .filter(_spot_pairs(latest))
+                 .order_by('id').values_list('id', 'zone_id', 'spot_number', 'spot_type', 'status'))
+        found = 0
+        by_status, deltas, changes = defaultdict(list), Counter(), []
+        for spot_id, zone_id, spot_number, spot_type, old_status in spots:
+            new_status = latest.get((zone_id, spot_number))
+            if new_status is None:
+                continue
+            found += 1
+            if new_status == old_status:
+                continue
+            by_status[new_status].append(spot_id)
+            deltas[zone_id] += status_delta(old_status, new_status)
+            changes.append(SpotChange(spot_id, zone_id, spot_type, old_status, new_status))
+
+        for new_status, spot_ids in by_status.items():
+            ParkingSpot.objects.filter(pk__in=spot_ids).update(status=new_status, version=version_expression())
+        for zone_id, delta in deltas.items():
+            adjust_available(zone_id, delta)
+        notify_changes(changes)
+
+    stats['updated'] += len(changes)
+    stats['unchanged'] += found - len(changes)
+    stats['unknown'] += len(latest) - found
+
+
+def _apply_latest(latest, stats):
+    items = list(latest.items())
+    chunk_size = getattr(settings, 'SENSOR_BATCH_SIZE', 1000)
+    for start in range(0, len(items), chunk_size):
+        _apply_chunk(dict(items[start:start + chunk_size]), stats)
+
+
+def apply_status_events(events):
+    stats = Counter(received=len(events), updated=0, unchanged=0, unknown=0, invalid=0)
+    latest = _latest_statuses(events, stats)
+    stats['duplicates'] = stats['received'] - stats['invalid'] - len(latest)
+    _apply_latest(latest, stats)
+    return dict(stats)
+
+
+class SensorEventBuffer:
+    # eventlar har bir joy uchun oxirgi holatgacha siqiladi va fon threadida
+    # interval tugaganda yoki max_size joy yig'ilganda bazaga yoziladi
+
+    def __init__(self, interval, max_size, max_attempts=3):
+        self.interval = interval
+        self.max_size = max_size
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.pending = {}
+        # (zone, spot_number) -> muvaffaqiyatsiz urinishlar soni
+        self.attempts = {}
+        self.stats = Counter(events_in=0, invalid=0, flushed_spots=0, writes_out=0, unchanged=0, unknown=0,
+                             flushes=0, failed_flushes=0, retried=0, dead_lettered=0)
+        self.thread = None
+
+    def submit(self, events):
+        stats = Counter()
+        latest = _latest_statuses(events, stats)
+        with self.lock:
+            self.stats['events_in'] += len(events)
+            self.stats['invalid'] += stats['invalid']
+            self.pending.update(latest)
+            size = len(self.pending)
+            if self.thread is None:
+                self._start()
+        if size >= self.max_size:
+            self.wakeup.set()
+        return {'accepted': len(events) - stats['invalid'], 'invalid': stats['invalid']}
+
+    def _start(self):
+        self.thread = threading.Thread(target=self._run, name='sensor-event-flusher', daemon=True)
+        self.thread.start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    def _flush_chunk(self, chunk, stats, failed):
+        try:
+            _apply_chunk(chunk, stats)
+        except TRANSIENT_ERRORS:
+            logger.exception("Sensor eventlarini yozib bo'lmadi, keyingi flushda qayta uriniladi")
+            failed.update(chunk)
+        except Exception:
+            if len(chunk) == 1:
+                logger.exception("Sensor eventini yozib bo'lmadi: %s", next(iter(chunk)))
+                failed.update(chunk)
+                return
+            # bitta buzuq qator butun chunkni to'xtatmasin: yarmlarga bo'lib qayta uriniladi
+            items = list(chunk.items())
+            self._flush_chunk(dict(items[:len(items) // 2]), stats, failed)
+            self._flush_chunk(dict(items[len(items) // 2:]), stats, failed)
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return
+        stats, failed = Counter(), {}
+        items = list(pending.items())
+        chunk_size = getattr(settings, 'SENSOR_BATCH_SIZE', 1000)
+        for start in range(0, len(items), chunk_size):
+            self._flush_chunk(dict(items[start:start + chunk_size]), stats, failed)
+
+        dropped = []
+        with self.lock:
+            for key in pending.keys() - failed.keys():
+                self.attempts.pop(key, None)
+            for key, status in failed.items():
+                attempts = self.attempts.pop(key, 0) + 1
+                if attempts >= self.max_attempts:
+                    dropped.append({'zone': key[0], 'spot_number': key[1], 'status': status, 'attempts': attempts})
+                elif key not in self.pending:
+                    # shu orada kelgan yangi holat ustun
+                    self.attempts[key] = attempts
+                    self.pending[key] = status
+            self.stats['flushes'] += 1
+            self.stats['failed_flushes'] += bool(failed)
+            self.stats['retried'] += len(failed) - len(dropped)
+            self.stats['dead_lettered'] += len(dropped)
+            self.stats['flushed_spots'] += len(pending) - len(failed)
+            self.stats['writes_out'] += stats['updated']
+            self.stats['unchanged'] += stats['unchanged']
+            self.stats['unknown'] += stats['unknown']
+        if dropped:
+            dead_letter.error('%s', json.dumps(dropped))
+
+    def snapshot(self):
+        with self.lock:
+            stats = dict(self.stats, pending=len(self.pending))
+        stats['coalesced'] = (stats['events_in'] - stats['invalid'] - stats['flushed_spots'] - stats['pending']
+                              - stats['dead_lettered'])
+        return stats
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_sensor_buffer():
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = SensorEventBuffer(getattr(settings, 'SENSOR_DEBOUNCE_SECONDS', 2),
+                                        getattr(settings, 'SENSOR_FLUSH_SIZE', 5000),
+                                        getattr(settings, 'SENSOR_MAX_ATTEMPTS', 3))
+        return _buffer
@@ -0,0 +1,146 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+logger = logging.getLogger(__name__)
+
+
+class MailQueueFull(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Xat yuborish navbati to'lgan, birozdan keyin qayta urinib ko'ring."
+    default_code = 'mail_queue_full'
+
+
+class MailQueue:
+    # so'rov faqat xatni navbatga qo'yadi; fon threadi navbatni bitta ochiq SMTP sessiya orqali bo'shatadi
+
+    def __init__(self, batch_size, idle_timeout, max_attempts, backoff, max_size=1000):
+        self.batch_size = batch_size
+        self.idle_timeout = idle_timeout
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        # SMTP ishlamay qolsa xotira cheksiz o'smasin: navbat to'lsa enqueue 503 beradi
+        self.queue = queue.Queue(maxsize=max_size)
+        self.lock = threading.Lock()
+        self.send_lock = threading.Lock()
+        self.connection = None
+        self.thread = None
+        self.stats = Counter(queued=0, sent=0, retried=0, failed=0, rejected=0)
+
+    def enqueue(self, message):
+        if not getattr(settings, 'MAIL_QUEUE_ASYNC', True):
+            # sinxron rejim: send_mail(fail_silently=False) kabi xato chaqiruvchiga qaytadi
+            self._deliver(message, attempts=1, raise_errors=True)
+            return
+        with self.lock:
+            if self.thread is None:
+                self._start()
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            with self.lock:
+                self.stats['rejected'] += 1
+            raise MailQueueFull()
+        with self.lock:
+            self.stats['queued'] += 1
+
+    def _start(self):
+        self.thread = threading.Thread(target=self._run, name='mail-sender', daemon=True)
+        self.thread.start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            try:
+                batch = [self.queue.get(timeout=self.idle_timeout)]
+            except queue.Empty:
+                # SMTP server bo'sh turgan ulanishni baribir uzadi
+                with self.send_lock:
+                    self._close()
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            for message in batch:
+                try:
+                    self._deliver(message)
+                finally:
+                    self.queue.task_done()
+
+    def _deliver(self, message, attempts=None, raise_errors=False):
+        attempts = attempts or self.max_attempts
+        for attempt in range(attempts):
+            with self.send_lock:
+                try:
+                    if self.connection is None:
+                        self.connection = get_connection(fail_silently=False)
+                        self.connection.open()
+                    self.connection.send_messages([message])
+                    self.stats['sent'] += 1
+                    return
+                except Exception as exc:
+                    error = exc
+                    logger.warning("Xat yuborilmadi (%s, urinish %d)", message.to, attempt + 1, exc_info=True)
+                    self._close()
+            if attempt + 1 < attempts:
+                # kutish send_lock siz: boshqa yuboruvchilar to'xtab qolmaydi
+                with self.lock:
+                    self.stats['retried'] += 1
+                time.sleep(min(self.backoff * 2 ** attempt, 30))
+        with self.lock:
+            self.stats['failed'] += 1
+        logger.error("Xat %d urinishdan keyin ham yuborilmadi: %s", attempts, message.to)
+        if raise_errors:
+            raise error
+
+    def _close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+    def flush(self):
+        # navbatdagi hamma xat yuborilguncha kutadi (atexit, testlar)
+        while True:
+            try:
+                message = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                self._deliver(message)
+            finally:
+                self.queue.task_done()
+        self.queue.join()
+
+    def snapshot(self):
+        return dict(self.stats, pending=self.queue.qsize())
+
+
+_mail_queue = None
+_mail_queue_lock = threading.Lock()
+
+
+def get_mail_queue():
+    global _mail_queue
+    with _mail_queue_lock:
+        if _mail_queue is None:
+            _mail_queue = MailQueue(getattr(settings, 'MAIL_BATCH_SIZE', 50), getattr(settings, 'MAIL_IDLE_SECONDS', 30),
+                                    getattr(settings, 'MAIL_MAX_ATTEMPTS', 5), getattr(settings, 'MAIL_RETRY_BACKOFF', 1),
+                                    getattr(settings, 'MAIL_QUEUE_SIZE', 1000))
+        return _mail_queue
+
+
+def queue_mail(subject, message, recipient_list, from_email=None):
+    get_mail_queue().enqueue(EmailMessage(subject, message, from_email or settings.EMAIL_HOST_USER, recipient_list))
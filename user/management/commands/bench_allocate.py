@@ -0,0 +1,67 @@
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import connection, OperationalError
+
+from user.allocation import allocate_spot, NoSpotAvailable
+from user.models import ParkingZone, ParkingSpot, Reservation, User
+
+
+class Command(BaseCommand):
+    help = "spots/allocate engine uchun parallel benchmark: vaqtinchalik zonada joylarni bir nechta threadda band qiladi"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--spots', type=int, default=1000)
+        parser.add_argument('--threads', type=int, default=16)
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        zone = ParkingZone.objects.create(name=f'bench-{tag}', address='bench', coordinates='0,0',
+                                          total_spots=options['spots'], available_spots=options['spots'])
+        ParkingSpot.objects.bulk_create(
+            [ParkingSpot(zone=zone, spot_number=f'B{i:05d}') for i in range(options['spots'])], batch_size=1000
+        )
+        user = User.objects.create(username=f'bench-{tag}', email=f'bench-{tag}@example.com', phone=f'bench-{tag}')
+
+        claimed, errors = [], Counter()
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                while True:
+                    try:
+                        spot, _ = allocate_spot(user, zone.pk)
+                    except NoSpotAvailable:
+                        return
+                    except OperationalError as exc:
+                        with lock:
+                            errors[type(exc).__name__] += 1
+                        continue
+                    with lock:
+                        claimed.append(spot.pk)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        try:
+            zone.refresh_from_db()
+            double_booked = len(claimed) - len(set(claimed))
+            self.stdout.write(f"backend: {connection.vendor}, threads: {options['threads']}, spots: {options['spots']}")
+            self.stdout.write(f"allocated: {len(claimed)} in {elapsed:.2f}s ({len(claimed) / elapsed:.0f} alloc/s)")
+            self.stdout.write(f"reservations: {Reservation.objects.filter(user_id=user).count()}, "
+                              f"double booked: {double_booked}, available_spots: {zone.live_available_spots}")
+            if errors:
+                self.stdout.write(f"retried errors: {dict(errors)}")
+        finally:
+            zone.delete()
+            user.delete()
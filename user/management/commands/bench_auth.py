@@ -0,0 +1,56 @@
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from user.authentication import CachedJWTAuthentication
+from user.models import User, RevokedToken
+from user.revocation import revocations
+from user.serializers import CustomTokenObtainPairSerializer
+
+
+class Command(BaseCommand):
+    help = "CachedJWTAuthentication.authenticate narxini revocation tekshiruvi bilan va usiz solishtiradi"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000)
+        parser.add_argument('--revoked', type=int, default=50000, help="DB dagi bekor qilingan tokenlar soni")
+
+    def _measure(self, request, count):
+        authentication = CachedJWTAuthentication()
+        authentication.authenticate(request)
+        started = time.perf_counter()
+        for _ in range(count):
+            authentication.authenticate(request)
+        return (time.perf_counter() - started) / count * 1e6
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        user = User.objects.create(username=f'bench-{tag}', email=f'bench-{tag}@example.com', phone=f'bench-{tag}')
+        expires_at = timezone.now() + timedelta(hours=1)
+        RevokedToken.objects.bulk_create(
+            [RevokedToken(jti=f'bench-{tag}-{i}', expires_at=expires_at) for i in range(options['revoked'])],
+            batch_size=1000,
+        )
+        try:
+            token = CustomTokenObtainPairSerializer.get_token(user).access_token
+            request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+            revocations.bloom = None
+
+            with override_settings(JWT_REVOCATION=False):
+                without = self._measure(request, options['requests'])
+            with override_settings(JWT_REVOCATION=True):
+                with_check = self._measure(request, options['requests'])
+
+            self.stdout.write(f"requests: {options['requests']}, revoked tokens: {options['revoked']}")
+            self.stdout.write(f"without revocation check: {without:.1f} us/request")
+            self.stdout.write(f"with Bloom filter check:  {with_check:.1f} us/request "
+                              f"(+{with_check - without:.1f} us)")
+        finally:
+            RevokedToken.objects.filter(jti__startswith=f'bench-{tag}-').delete()
+            user.delete()
+            revocations.bloom = None
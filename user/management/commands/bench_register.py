@@ -0,0 +1,73 @@
+import threading
+import time
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from user.models import User
+from user.serializers import RegisterModelSerializer
+
+
+class DoubleHashRegisterSerializer(RegisterModelSerializer):
+    # avvalgi yo'l: validate_password da make_password, create da yana set_password
+    def validate_password(self, value):
+        return make_password(value)
+
+    def create(self, validated_data):
+        password = validated_data.pop('password')
+        user = User(**validated_data)
+        user.set_password(password)
+        user.save()
+        return user
+
+
+class Command(BaseCommand):
+    help = "Ro'yxatdan o'tish tezligi: ikki marta hash (avvalgi) va bitta hash + cheklangan pool (hozirgi)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=40)
+        parser.add_argument('--threads', type=int, default=8)
+
+    def _run(self, serializer_class, tag, phone_prefix, count, threads):
+        counter = iter(range(count))
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        index = next(counter, None)
+                    if index is None:
+                        return
+                    serializer = serializer_class(data={
+                        'username': f'{tag}-{index}', 'email': f'{tag}-{index}@example.com',
+                        'password': 'bench-password', 'phone': f'{phone_prefix}{index:05d}',
+                    })
+                    serializer.is_valid(raise_exception=True)
+                    serializer.save()
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return count / (time.perf_counter() - started)
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:6]
+        # phone faqat raqamlardan iborat bo'lishi kerak
+        phone = str(uuid.uuid4().int)[:8]
+        try:
+            before = self._run(DoubleHashRegisterSerializer, f'b{tag}', f'1{phone}', options['users'], options['threads'])
+            after = self._run(RegisterModelSerializer, f'a{tag}', f'2{phone}', options['users'], options['threads'])
+        finally:
+            User.objects.filter(username__startswith=f'b{tag}-').delete()
+            User.objects.filter(username__startswith=f'a{tag}-').delete()
+        self.stdout.write(f"users: {options['users']}, threads: {options['threads']}")
+        self.stdout.write(f"double hash: {before:.1f} registrations/s")
+        self.stdout.write(f"single hash: {after:.1f} registrations/s ({after / before:.1f}x)")
@@ -0,0 +1,49 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from user.fastpath import serialize_rows
+from user.models import ParkingZone, ParkingSpot
+from user.renderers import FastJSONRenderer
+from user.serializers import ParkingSpotSerializer
+
+
+class Command(BaseCommand):
+    help = "spots/list uchun ModelSerializer va compiled (.values()) yo'lini vaqtinchalik zonada solishtiradi"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--spots', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def _measure(self, func, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        zone = ParkingZone.objects.create(name=f'bench-{tag}', address='bench', coordinates='0,0',
+                                          total_spots=options['spots'], available_spots=options['spots'])
+        try:
+            ParkingSpot.objects.bulk_create(
+                [ParkingSpot(zone=zone, spot_number=f'B{i:05d}') for i in range(options['spots'])], batch_size=1000
+            )
+            queryset = ParkingSpot.objects.filter(zone=zone).order_by('id')
+
+            model_path = self._measure(
+                lambda: JSONRenderer().render(ParkingSpotSerializer(queryset, many=True).data), options['repeat'])
+            compiled_path = self._measure(
+                lambda: FastJSONRenderer().render(serialize_rows(queryset, ParkingSpotSerializer)), options['repeat'])
+
+            self.stdout.write(f"spots: {options['spots']}, best of {options['repeat']}")
+            self.stdout.write(f"ModelSerializer + JSONRenderer: {model_path * 1000:.1f} ms")
+            self.stdout.write(f"compiled + FastJSONRenderer:   {compiled_path * 1000:.1f} ms "
+                              f"({model_path / compiled_path:.1f}x)")
+        finally:
+            zone.delete()
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from user.counters import fold_zone_shards
+
+
+class Command(BaseCommand):
+    help = "ZoneCounterShard deltalarini ParkingZone.available_spots ga qo'shadi (cron orqali muntazam ishga tushiriladi)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--zone', type=int, action='append', dest='zones', help='Faqat shu zone id lar')
+
+    def handle(self, *args, **options):
+        folded = fold_zone_shards(options['zones'])
+        self.stdout.write(self.style.SUCCESS(f"{len(folded)} ta zone counteri yig'ildi"))
@@ -0,0 +1,39 @@
+import csv
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from user.importing import import_users
+
+
+def _ndjson_rows(handle):
+    for number, line in enumerate(handle, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as exc:
+            raise CommandError(f'NDJSON parse error on line {number}: {exc}')
+
+
+class Command(BaseCommand):
+    help = "CSV yoki NDJSON fayldan foydalanuvchilarni chunk lab import qiladi (fayl xotiraga to'liq yuklanmaydi)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], default=None)
+        parser.add_argument('--chunk-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        file_format = options['format'] or ('csv' if path.suffix.lower() == '.csv' else 'ndjson')
+        with path.open(newline='', encoding='utf-8') as handle:
+            rows = csv.DictReader(handle) if file_format == 'csv' else _ndjson_rows(handle)
+            stats = import_users(rows, options['chunk_size'])
+
+        for error in stats['errors']:
+            self.stderr.write(f"row {error['row']}: {json.dumps(error['errors'], ensure_ascii=False)}")
+        self.stdout.write(self.style.SUCCESS(
+            f"created: {stats['created']}, duplicate: {stats['duplicate']}, invalid: {stats['invalid']}"))
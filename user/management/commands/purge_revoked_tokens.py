@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from user.revocation import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Muddati o'tgan RevokedToken qatorlarini o'chiradi (cron orqali muntazam ishga tushiriladi)"
+
+    def handle(self, *args, **options):
+        deleted = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"{deleted} ta eskirgan token o'chirildi"))
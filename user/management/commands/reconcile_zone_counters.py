@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from user.availability import get_availability
+from user.counters import reconcile_zone_counters
+
+
+class Command(BaseCommand):
+    help = "ParkingZone.available_spots counterlarini bitta GROUP BY so'rovi bilan qayta hisoblaydi"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--zone', type=int, action='append', dest='zones', help='Faqat shu zone id lar')
+
+    def handle(self, *args, **options):
+        changed = reconcile_zone_counters(options['zones'])
+        for zone in changed:
+            self.stdout.write(f"{zone.pk}: available_spots={zone.available_spots}")
+        self.stdout.write(self.style.SUCCESS(f"{len(changed)} ta zone yangilandi"))
+        get_availability().rebuild()
+        self.stdout.write(self.style.SUCCESS("Availability bitmaplari qayta qurildi"))
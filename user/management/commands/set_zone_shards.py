@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from user.counters import set_zone_shards
+from user.models import ParkingZone
+
+
+class Command(BaseCommand):
+    help = "Zone uchun sharded counterni yoqadi (shards > 0) yoki o'chiradi (shards = 0)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('zone', type=int)
+        parser.add_argument('shards', type=int)
+
+    def handle(self, *args, **options):
+        if options['shards'] < 0:
+            raise CommandError("shards manfiy bo'lishi mumkin emas")
+        zone = ParkingZone.objects.filter(pk=options['zone']).first()
+        if zone is None:
+            raise CommandError("Bunday zone topilmadi")
+        set_zone_shards(zone, options['shards'])
+        self.stdout.write(self.style.SUCCESS(f"{zone.pk}: shard_count={zone.shard_count}"))
@@ -0,0 +1,204 @@
+import atexit
+import bisect
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+
+# har bir gunicorn worker o'z qiymatlarini METRICS_DIR/<pid>-<token>.json ga yozadi, /metrics hammasini qo'shib beradi;
+# to'xtagan workerlarning counterlari retired.json ga qo'shilib, fayli o'chiriladi
+RETIRED = 'retired.json'
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    'http_requests_total': ('counter', "View bo'yicha so'rovlar soni"),
+    'http_requests_in_flight': ('gauge', "Hozir bajarilayotgan so'rovlar"),
+    'http_request_duration_seconds': ('histogram', "So'rov bajarilish vaqti"),
+    'db_query_duration_seconds': ('histogram', "Bitta so'rov ichidagi umumiy SQL vaqti"),
+}
+
+
+def _labels(labels):
+    return ','.join(f'{key}="{value}"' for key, value in labels)
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = defaultdict(float)  # (metric, labels) -> qiymat
+        self.histograms = {}  # (metric, labels) -> [bucket sonlari..., sum, count]
+        self.flush_lock = threading.Lock()
+        self.flushed_at = 0.0
+
+    def inc(self, metric, labels, amount=1):
+        with self.lock:
+            self.values[metric, labels] += amount
+
+    def observe(self, metric, labels, value):
+        with self.lock:
+            histogram = self.histograms.get((metric, labels))
+            if histogram is None:
+                histogram = self.histograms[metric, labels] = [0] * (len(BUCKETS) + 2)
+            histogram[bisect.bisect_left(BUCKETS, value)] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'values': [[metric, labels, value] for (metric, labels), value in self.values.items()],
+                'histograms': [[metric, labels, list(data)] for (metric, labels), data in self.histograms.items()],
+            }
+
+    def flush(self, force=False):
+        directory = getattr(settings, 'METRICS_DIR', None)
+        if not directory:
+            return
+        with self.flush_lock:
+            now = time.monotonic()
+            if not force and now - self.flushed_at < getattr(settings, 'METRICS_FLUSH_SECONDS', 1):
+                return
+            self.flushed_at = now
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f'{os.getpid()}-{_process_token()}.json')
+            # yarim yozilgan faylni o'qib qolmaslik uchun tmp + rename
+            with open(f'{path}.tmp', 'w') as file:
+                json.dump(self.snapshot(), file)
+            os.replace(f'{path}.tmp', path)
+
+
+_token = (None, None)
+
+
+def _process_token():
+    # PID qayta ishlatilsa yangi worker eski faylni davom ettirmasligi uchun har bir process o'z tokenini oladi
+    # (fork dan keyin ham: token pid bilan birga saqlanadi)
+    global _token
+    pid, token = _token
+    if pid != os.getpid():
+        _token = pid, token = os.getpid(), uuid.uuid4().hex[:8]
+    return token
+
+
+registry = Registry()
+atexit.register(registry.flush, force=True)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _merge(values, histograms, snapshot, gauges=True):
+    for metric, labels, value in snapshot['values']:
+        if METRICS[metric][0] == 'gauge' and not gauges:
+            continue
+        values[metric, tuple(map(tuple, labels))] += value
+    for metric, labels, data in snapshot['histograms']:
+        key = (metric, tuple(map(tuple, labels)))
+        total = histograms.setdefault(key, [0] * len(data))
+        for index, value in enumerate(data):
+            total[index] += value
+
+
+def _worker_files(directory):
+    # pid bo'yicha eng yangi fayl - tirik worker; pid o'lgan bo'lsa yoki shu pid da yangiroq fayl bo'lsa - to'xtagan
+    files = {}
+    for name in os.listdir(directory):
+        if not name.endswith('.json') or name == RETIRED:
+            continue
+        path = os.path.join(directory, name)
+        try:
+            files[path] = (int(name[:-5].split('-')[0]), os.stat(path).st_mtime)
+        except (OSError, ValueError):
+            continue
+    newest = {}
+    for path, (pid, mtime) in files.items():
+        if pid not in newest or mtime > files[newest[pid]][1]:
+            newest[pid] = path
+    live = {path for pid, path in newest.items() if _alive(pid)}
+    return live, set(files) - live
+
+
+def _retire(directory, paths):
+    # to'xtagan workerlar counterlari retired.json ga ko'chiriladi (gauge lar tashlanadi), fayllari o'chiriladi.
+    # Bir nechta worker bir vaqtda /metrics ga javob bersa ikki marta qo'shilmasligi uchun flock
+    with open(os.path.join(directory, 'retired.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        values, histograms = defaultdict(float), {}
+        retired = _read(os.path.join(directory, RETIRED))
+        if retired:
+            _merge(values, histograms, retired)
+        merged = []
+        for path in paths:
+            snapshot = _read(path)
+            if snapshot is not None:
+                _merge(values, histograms, snapshot, gauges=False)
+                merged.append(path)
+        if not merged:
+            return
+        path = os.path.join(directory, RETIRED)
+        with open(f'{path}.tmp', 'w') as file:
+            json.dump({'values': [[metric, labels, value] for (metric, labels), value in values.items()],
+                       'histograms': [[metric, labels, data] for (metric, labels), data in histograms.items()]}, file)
+        os.replace(f'{path}.tmp', path)
+        for path in merged:
+            os.remove(path)
+
+
+def collect():
+    values, histograms = defaultdict(float), {}
+    directory = getattr(settings, 'METRICS_DIR', None)
+    if not directory or not os.path.isdir(directory):
+        _merge(values, histograms, registry.snapshot())
+        return values, histograms
+    registry.flush(force=True)
+    live, dead = _worker_files(directory)
+    if dead:
+        _retire(directory, dead)
+    for path in [*live, os.path.join(directory, RETIRED)]:
+        snapshot = _read(path)
+        if snapshot is not None:
+            _merge(values, histograms, snapshot)
+    return values, histograms
+
+
+def render():
+    values, histograms = collect()
+    lines = []
+    for metric, (kind, description) in METRICS.items():
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} {kind}')
+        if kind != 'histogram':
+            for (name, labels), value in sorted(values.items()):
+                if name == metric:
+                    lines.append(f'{metric}{{{_labels(labels)}}} {float(value)!r}')
+            continue
+        for (name, labels), data in sorted(histograms.items()):
+            if name != metric:
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), data):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{{_labels(labels + (("le", bound),))}}} {cumulative}')
+            lines.append(f'{metric}_sum{{{_labels(labels)}}} {float(data[-2])!r}')
+            lines.append(f'{metric}_count{{{_labels(labels)}}} {data[-1]}')
+    return '\n'.join(lines) + '\n'
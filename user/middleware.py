@@ -0,0 +1,159 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from user.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# parametrlar SQL dan alohida keladi, faqat IN (%s, %s, ...) uzunligi va sonli literallar farq qiladi
+IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+NUMBER = re.compile(r'\b\d+\b')
+
+# joriy so'rov statistikasi; sync_to_async threadlariga ham context bilan birga o'tadi
+current_stats = ContextVar('query_stats', default=None)
+
+
+def fingerprint(sql):
+    return NUMBER.sub('N', IN_LIST.sub('(...)', sql))
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def add(self, sql, duration):
+        self.count += 1
+        self.duration += duration
+        self.fingerprints[fingerprint(sql)] += 1
+
+    def repeated(self, threshold):
+        return [(sql, count) for sql, count in self.fingerprints.most_common() if count > threshold]
+
+
+def record_query(execute, sql, params, many, context):
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add(sql, time.perf_counter() - started)
+
+
+def install(connection, **kwargs):
+    # wrapper ulanishda doimiy turadi, so'rovdan tashqarida (current_stats None) hech narsa yozmaydi
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install)
+
+
+class QueryInstrumentationMiddleware:
+    # har bir so'rov uchun SQL soni va vaqti Server-Timing headerida; bir xil SQL ko'p takrorlansa (N+1) warning
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not getattr(settings, 'QUERY_INSTRUMENTATION', True):
+            return self.get_response(request)
+        for connection in connections.all(initialized_only=True):
+            install(connection)
+        stats, started = QueryStats(), time.perf_counter()
+        request.query_stats = stats
+        token = current_stats.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self._report(request, response, stats, started)
+
+    async def __acall__(self, request):
+        if not getattr(settings, 'QUERY_INSTRUMENTATION', True):
+            return await self.get_response(request)
+        stats, started = QueryStats(), time.perf_counter()
+        request.query_stats = stats
+        token = current_stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self._report(request, response, stats, started)
+
+    def _report(self, request, response, stats, started):
+        total = time.perf_counter() - started
+        response['Server-Timing'] = (f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries", '
+                                     f'app;dur={total * 1000:.1f}')
+        threshold = getattr(settings, 'QUERY_REPEAT_THRESHOLD', 10)
+        for sql, count in stats.repeated(threshold):
+            logger.warning("N+1: %s %s da bitta so'rov %d marta bajarildi: %s",
+                           request.method, request.path, count, sql[:300])
+        return response
+
+
+class MetricsMiddleware:
+    # /metrics uchun: url name bo'yicha latency/DB vaqti histogrammalari, status counterlari, in-flight gauge
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            self._finish(request)
+        return self._record(request, response, started)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self._finish(request)
+        return self._record(request, response, started)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        request.metrics_view = (('view', match.url_name or match.view_name),)
+        registry.inc('http_requests_in_flight', request.metrics_view)
+
+    def _finish(self, request):
+        if hasattr(request, 'metrics_view'):
+            registry.inc('http_requests_in_flight', request.metrics_view, -1)
+
+    def _record(self, request, response, started):
+        view = getattr(request, 'metrics_view', (('view', 'unmatched'),))
+        registry.inc('http_requests_total', view + (('method', request.method), ('status', str(response.status_code))))
+        registry.observe('http_request_duration_seconds', view, time.perf_counter() - started)
+        stats = getattr(request, 'query_stats', None)
+        if stats is not None:
+            registry.observe('db_query_duration_seconds', view, stats.duration)
+        registry.flush()
+        return response
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-17 18:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0009_alter_payment_transaction_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parkingzone',
+            name='shard_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='ZoneCounterShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.PositiveSmallIntegerField()),
+                ('delta', models.IntegerField(default=0)),
+                ('zone', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counter_shards', to='user.parkingzone')),
+            ],
+            options={
+                'unique_together': {('zone', 'slot')},
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.1 on 2026-10-17 18:56
+
+from django.db import migrations, models
+
+
+def parse_coordinates(value):
+    # user.models.parse_coordinates nusxasi: migratsiya model kodining keyingi o'zgarishlariga bog'lanmasin
+    parts = (value or '').replace(',', ' ').split()
+    if len(parts) != 2:
+        return None
+    try:
+        lat, lon = float(parts[0]), float(parts[1])
+    except ValueError:
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+def fill_lat_lon(apps, schema_editor):
+    ParkingZone = apps.get_model('user', 'ParkingZone')
+    zones = []
+    for zone in ParkingZone.objects.only('id', 'coordinates'):
+        zone.latitude, zone.longitude = parse_coordinates(zone.coordinates) or (None, None)
+        zones.append(zone)
+    ParkingZone.objects.bulk_update(zones, ['latitude', 'longitude'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0010_zone_counter_shards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parkingzone',
+            name='latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='parkingzone',
+            name='longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(fill_lat_lon, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.1 on 2026-10-17 19:04
+
+from django.db import migrations, models
+
+
+def backfill_versions(apps, schema_editor):
+    # mavjud qatorlar 1-versiyani oladi
+    apps.get_model('user', 'ParkingZone').objects.update(version=1)
+    apps.get_model('user', 'ParkingSpot').objects.update(version=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0011_parkingzone_latitude_longitude'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='parkingspot',
+            name='version',
+            field=models.BigIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='parkingzone',
+            name='version',
+            field=models.BigIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(backfill_versions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.1 on 2026-10-17 19:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0012_change_versions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='parkingspot',
+            index=models.Index(fields=['zone', 'id'], name='user_spot_zone_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='user_payment_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['user_id', '-start_time', '-id'], name='user_reservation_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.1 on 2026-10-17 21:40
+
+from django.db import migrations
+
+# prefix qidiruv (user/search.py) uchun: "C" collation da B-tree LIKE 'q%' ni range scan qiladi va ORDER BY ni qoplaydi
+SEARCH_INDEXES = {
+    'user_user_username_prefix_idx': '(lower(username) COLLATE "C")',
+    'user_user_email_prefix_idx': '(lower(email) COLLATE "C")',
+    'user_user_phone_prefix_idx': '(phone COLLATE "C")',
+}
+
+
+def create_search_indexes(apps, schema_editor):
+    # SQLite da qidiruv worker xotirasidagi saralangan massiv orqali ishlaydi
+    if schema_editor.connection.vendor == 'postgresql':
+        for name, expression in SEARCH_INDEXES.items():
+            schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON user_user ({expression})")
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for name in SEARCH_INDEXES:
+            schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0014_revoked_tokens'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.1 on 2026-10-17 22:05
+
+from django.db import migrations, models
+
+
+def drop_version_sequence(apps, schema_editor):
+    # versiya endi txid_current() dan olinadi (user.models.next_version)
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("DROP SEQUENCE IF EXISTS user_change_version_seq")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0015_user_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('spot', 'Joy'), ('zone', 'Zona')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('version', models.BigIntegerField(db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='zonecountershard',
+            name='version',
+            field=models.BigIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(drop_version_sequence, migrations.RunPython.noop),
+    ]
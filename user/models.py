@@ -1,13 +1,64 @@
 from django.contrib.auth.hashers import make_password
-from django.db.models import DateTimeField
+from django.db import connection, transaction
+from django.db.models import DateTimeField, Sum, Index
+from django.db.models.expressions import RawSQL
 from django.contrib.auth.models import AbstractUser, UserManager
 from django.db.models import TextChoices, Model, ForeignKey, CASCADE
-from django.db.models.fields import CharField, PositiveIntegerField, TextField
+from django.db.models.fields import CharField, PositiveIntegerField, TextField, PositiveSmallIntegerField, \
+    IntegerField, FloatField, BigIntegerField
 from rest_framework.fields import DecimalField, BooleanField
 
+from user.hashing import check_hashed_password
+
 
 # Create your models here.
 
+# SQLite: har shuncha versiyada eski ChangeVersion qatorlari o'chiriladi
+VERSION_CLEANUP_EVERY = 1000
+
+
+def next_version():
+    # spot/zone o'zgarishlari uchun umumiy o'suvchi versiya (spots/changes feed).
+    # PostgreSQL da versiya - yozayotgan tranzaksiya txid si: sequence qiymatlari commit tartibida emas,
+    # txid esa snapshot xmin bilan "shundan oldingilar tugagan" chegarasini beradi (user.changefeed)
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT txid_current()")
+            return cursor.fetchone()[0]
+    version = ChangeVersion.objects.create().pk
+    if version % VERSION_CLEANUP_EVERY == 0:
+        # AUTOINCREMENT id larni qayta ishlatmaydi - eski qatorlar endi kerak emas
+        ChangeVersion.objects.filter(pk__lt=version).delete()
+    return version
+
+
+def version_expression():
+    # PostgreSQL da UPDATE ichida txid_current() - qo'shimcha so'rovsiz
+    if connection.vendor == 'postgresql':
+        return RawSQL("txid_current()", [])
+    return next_version()
+
+
+def _with_version(kwargs):
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None:
+        kwargs['update_fields'] = {*update_fields, 'version'}
+    return kwargs
+
+
+def parse_coordinates(value):
+    # "41.311,69.279" yoki "41.311 69.279" -> (lat, lon)
+    parts = (value or '').replace(',', ' ').split()
+    if len(parts) != 2:
+        return None
+    try:
+        lat, lon = float(parts[0]), float(parts[1])
+    except ValueError:
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
 
 class CustomerUser(UserManager):
     def _create_user_object(self,email, password, **extra_fields):
@@ -49,11 +100,29 @@ class User(AbstractUser):
     role = CharField(choices=RoleType, default=RoleType.USER, max_length=100)
     objects = CustomerUser()
 
+    def check_password(self, raw_password):
+        # login (ModelBackend) PBKDF2 ni user.hashing pooli orqali tekshiradi; hash yangilash kam bo'ladi, shu threadda
+        valid, must_update = check_hashed_password(raw_password, self.password)
+        if valid and must_update:
+            self.set_password(raw_password)
+            self._password = None
+            self.save(update_fields=['password'])
+        return valid
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        if fields is not None and getattr(self, '_load_deferred_together', False):
+            # user.authentication.claims_user: birinchi deferred field so'ralganda qolganlari ham shu so'rovda
+            self._load_deferred_together = False
+            fields = {*fields, *self.get_deferred_fields()}
+        super().refresh_from_db(using, fields, from_queryset)
+
 
 class ParkingZone(Model):
     name = CharField(max_length=255, unique=True)
     address = TextField()
     coordinates = CharField(max_length=255)
+    latitude = FloatField(null=True, blank=True, editable=False)
+    longitude = FloatField(null=True, blank=True, editable=False)
     total_spots = PositiveIntegerField()
     available_spots = PositiveIntegerField()
     hourly_rate = DecimalField(max_digits=10, decimal_places=2)
@@ -61,10 +130,46 @@ class ParkingZone(Model):
     monthly_rate = DecimalField(max_digits=10, decimal_places=2)
     is_active = BooleanField(default=True)
     created_at = DateTimeField(auto_now_add=True)
+    # 0 - oddiy counter, >0 - available_spots o'zgarishlari shu sondagi ZoneCounterShard slotlariga yoziladi
+    shard_count = PositiveSmallIntegerField(default=0)
+    version = BigIntegerField(default=0, db_index=True)
 
     def __str__(self):
         return f"{self.name} - {self.coordinates} - {self.created_at}"
 
+    def save(self, *args, **kwargs):
+        self.latitude, self.longitude = parse_coordinates(self.coordinates) or (None, None)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'coordinates' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'latitude', 'longitude'}
+        # autocommit da txid_current() alohida (allaqachon commit bo'lgan) tranzaksiyaniki bo'lib qolmasin
+        with transaction.atomic(savepoint=False):
+            self.version = next_version()
+            super().save(*args, **_with_version(kwargs))
+
+    @property
+    def live_available_spots(self):
+        if not self.shard_count:
+            return self.available_spots
+        pending = getattr(self, 'pending_available', None)
+        if pending is None:
+            pending = self.counter_shards.aggregate(total=Sum('delta'))['total'] or 0
+        return max(self.available_spots + pending, 0)
+
+
+class ZoneCounterShard(Model):
+    zone = ForeignKey('user.ParkingZone', CASCADE, related_name='counter_shards')
+    slot = PositiveSmallIntegerField()
+    delta = IntegerField(default=0)
+    # delta o'zgargan versiya: zona qatorini qayta qulflamasdan spots/changes feed zonani o'zgargan deb ko'radi
+    version = BigIntegerField(default=0, db_index=True)
+
+    class Meta:
+        unique_together = ('zone', 'slot')
+
+    def __str__(self):
+        return f"{self.zone_id} - {self.slot} - {self.delta}"
+
 
 class ParkingSpot(Model):
     class StatusChoices(TextChoices):
@@ -85,12 +190,49 @@ class ParkingSpot(Model):
     spot_type = CharField(max_length=20, choices=SpotType.choices, default=SpotType.REGULAR)
     is_active = BooleanField(default=True)
     created_at = DateTimeField(auto_now_add=True)
+    version = BigIntegerField(default=0, db_index=True)
     class Meta:
         unique_together = ('zone', 'spot_number')
+        indexes = [Index(fields=['zone', 'id'], name='user_spot_zone_id_idx')]
 
     def __str__(self):
         return f"{self.zone.name} - {self.spot_number} - {self.created_at.strftime('%d/%m/%Y %H:%M')} - {self.is_active}"
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            self.version = next_version()
+            super().save(*args, **_with_version(kwargs))
+
+
+class ChangeVersion(Model):
+    # PostgreSQL bo'lmagan bazalarda versiya manbai: har bir yangi qator id si keyingi versiya
+    pass
+
+
+class ChangeTombstone(Model):
+    # o'chirilgan spot/zone lar: spots/changes feed mijozlarga ularni ham versiya bo'yicha yetkazadi
+    class KindChoices(TextChoices):
+        SPOT = 'spot', 'Joy'
+        ZONE = 'zone', 'Zona'
+
+    kind = CharField(max_length=10, choices=KindChoices.choices)
+    object_id = BigIntegerField()
+    version = BigIntegerField(db_index=True)
+
+    def __str__(self):
+        return f"{self.kind} - {self.object_id} - {self.version}"
+
+
+class RevokedToken(Model):
+    # bekor qilingan JWT lar (jti bo'yicha); expires_at dan keyin token baribir yaroqsiz, qatorni o'chirish mumkin
+    jti = CharField(max_length=255, unique=True)
+    user = ForeignKey('user.User', CASCADE, related_name='revoked_tokens', null=True, blank=True)
+    expires_at = DateTimeField(db_index=True)
+    created_at = DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.jti} - {self.expires_at}"
+
 
 class Reservation(Model):
     class StatusChoices(TextChoices):
@@ -105,6 +247,9 @@ class Reservation(Model):
     end_time = DateTimeField(auto_now=True)
     status_total_amount = CharField(max_length=20, choices=StatusChoices.choices, default=StatusChoices.PENDING)
 
+    class Meta:
+        indexes = [Index(fields=['user_id', '-start_time', '-id'], name='user_reservation_keyset_idx')]
+
     def __str__(self):
         return f"{self.user_id} - {self.spot_id} - {self.start_time} - {self.end_time}"
 
@@ -131,6 +276,9 @@ class Payment(Model):
     transaction_id = CharField(max_length=20, unique=True)
     created_at = DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [Index(fields=['user', '-created_at', '-id'], name='user_payment_keyset_idx')]
+
     def __str__(self):
         return f"{self.user_id} - {self.payment_method} - {self.status} - {self.transaction_id} - {self.reservation_id}"
 
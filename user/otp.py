@@ -0,0 +1,94 @@
+import json
+import secrets
+import threading
+import time
+
+from django.conf import settings
+
+from user.redis_client import get_redis
+
+# verify() natijalari
+EXPIRED, INVALID, VERIFIED = 'expired', 'invalid', 'verified'
+
+# GET + kodni solishtirish + "tasdiqlandi" holatiga o'tkazish bitta round tripda
+VERIFY_SCRIPT = """
+local data = redis.call('GET', KEYS[1])
+if not data then return 'expired' end
+local ok, otp = pcall(cjson.decode, data)
+if not ok or otp['code'] == nil or tostring(otp['code']) ~= ARGV[1] then return 'invalid' end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 'verified'
+"""
+
+
+def generate_code():
+    return secrets.randbelow(900000) + 100000
+
+
+def _key(email):
+    return f'otp:{email}'
+
+
+def _ttl(name, default):
+    return int(getattr(settings, name, default))
+
+
+class RedisOTPStore:
+    def __init__(self):
+        self.redis = get_redis()
+        self.verify_script = self.redis.register_script(VERIFY_SCRIPT)
+
+    def issue(self, email, code):
+        self.redis.set(_key(email), json.dumps({'code': code, 'status': 'False'}), ex=_ttl('OTP_CODE_TTL', 60))
+
+    def verify(self, email, code):
+        result = self.verify_script(keys=[_key(email)], args=[str(code), json.dumps({'status': 'True'}),
+                                                              _ttl('OTP_VERIFIED_TTL', 120)])
+        return result.decode() if isinstance(result, bytes) else result
+
+    def is_verified(self, email):
+        # None - kod yo'q yoki muddati tugagan
+        data = self.redis.get(_key(email))
+        return None if data is None else json.loads(data).get('status') == 'True'
+
+
+class MemoryOTPStore:
+    # testlar va Redis siz dev uchun; bitta process ichida
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.items = {}
+
+    def _get(self, email):
+        item = self.items.get(_key(email))
+        if item is None or item[0] < time.monotonic():
+            return None
+        return item[1]
+
+    def issue(self, email, code):
+        with self.lock:
+            self.items[_key(email)] = (time.monotonic() + _ttl('OTP_CODE_TTL', 60), {'code': code, 'status': 'False'})
+
+    def verify(self, email, code):
+        with self.lock:
+            otp = self._get(email)
+            if otp is None:
+                return EXPIRED
+            if otp.get('code') is None or str(otp['code']) != str(code):
+                return INVALID
+            self.items[_key(email)] = (time.monotonic() + _ttl('OTP_VERIFIED_TTL', 120), {'status': 'True'})
+            return VERIFIED
+
+    def is_verified(self, email):
+        with self.lock:
+            otp = self._get(email)
+        return None if otp is None else otp.get('status') == 'True'
+
+
+_stores = {}
+
+
+def get_otp_store():
+    backend = getattr(settings, 'OTP_BACKEND', 'redis')
+    if backend not in _stores:
+        _stores[backend] = MemoryOTPStore() if backend == 'memory' else RedisOTPStore()
+    return _stores[backend]
@@ -0,0 +1,101 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise NotFound('Invalid cursor')
+
+
+class KeysetPagination(BasePagination):
+    # sahifa oxirgi qator kaliti (masalan (zone_id, id)) bo'yicha olinadi - OFFSET yo'q,
+    # shuning uchun chuqur sahifalar ham birinchi sahifa kabi tez
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering = ('-id',)
+
+    def get_page_size(self, request):
+        page_size = getattr(settings, 'KEYSET_PAGE_SIZE', 100)
+        max_page_size = getattr(settings, 'KEYSET_MAX_PAGE_SIZE', 1000)
+        try:
+            requested = int(request.query_params.get(self.page_size_query_param, page_size))
+        except ValueError:
+            return page_size
+        return min(max(requested, 1), max_page_size)
+
+    def _fields(self, queryset):
+        fields = []
+        for name in self.ordering:
+            descending = name.startswith('-')
+            attname = name.lstrip('-')
+            fields.append((attname, descending, queryset.model._meta.get_field(attname)))
+        return fields
+
+    def _after(self, fields, values):
+        if not isinstance(values, list) or len(values) != len(fields):
+            raise NotFound('Invalid cursor')
+        try:
+            values = [field.to_python(value) for (_, _, field), value in zip(fields, values)]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound('Invalid cursor')
+
+        # a >= x AND (a > x OR (a = x AND b > y) ...) - birinchi shart indeks bo'yicha range scan beradi
+        first, first_descending, _ = fields[0]
+        condition = Q(**{f"{first}__{'lte' if first_descending else 'gte'}": values[0]})
+        expanded, equal = Q(), {}
+        for (name, descending, _), value in zip(fields, values):
+            expanded |= Q(**equal, **{f"{name}__{'lt' if descending else 'gt'}": value})
+            equal[name] = value
+        return condition & expanded
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.ordering = getattr(view, 'ordering', None) or self.ordering
+        self.request = request
+        fields = self._fields(queryset)
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self._after(fields, decode_cursor(cursor)))
+
+        page_size = self.get_page_size(request)
+        page = list(queryset[:page_size + 1])
+        self.has_next = len(page) > page_size
+        page = page[:page_size]
+        self.next_cursor = None
+        if self.has_next:
+            last = page[-1]
+            # sahifa model obyektlari yoki .values() qatorlari bo'lishi mumkin
+            key = last.__getitem__ if isinstance(last, dict) else last.__getattribute__
+            self.next_cursor = encode_cursor([key(name) for name, _, _ in fields])
+        return page
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def add_headers(self, response):
+        next_link = self.get_next_link()
+        if next_link:
+            response['Link'] = f'<{next_link}>; rel="next"'
+        return response
+
+    def get_paginated_response(self, data):
+        # javob tanasi avvalgidek ro'yxat, keyingi sahifa Link headerida
+        return self.add_headers(Response(data))
@@ -0,0 +1,125 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+from user.models import ParkingSpot
+from user.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'spot-events'
+FREE_STATUS = ParkingSpot.StatusChoices.EMPTY
+
+
+class Hub:
+    # bitta worker ichidagi obunachilar: zone_id -> {(loop, queue)}
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self.lock = threading.Lock()
+        self.subscribers = defaultdict(set)
+
+    def subscribe(self, zone_ids):
+        loop = asyncio.get_running_loop()
+        subscriber = (loop, asyncio.Queue(maxsize=self.queue_size))
+        with self.lock:
+            for zone_id in zone_ids:
+                self.subscribers[zone_id].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber, zone_ids):
+        with self.lock:
+            for zone_id in zone_ids:
+                self.subscribers[zone_id].discard(subscriber)
+                if not self.subscribers[zone_id]:
+                    del self.subscribers[zone_id]
+
+    def has_subscribers(self):
+        return bool(self.subscribers)
+
+    def dispatch(self, event):
+        with self.lock:
+            subscribers = list(self.subscribers.get(event['zone'], ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(_offer, queue, event)
+
+
+# navbat to'lib qolgan obunachiga: tashlangan available_delta lar o'rniga to'liq snapshot qayta yuborilsin
+RESYNC = {'resync': True}
+
+
+def _offer(queue, event):
+    # sekin mijoz butun hubni to'xtatmasin: navbat to'lsa hammasi tashlanadi va bitta RESYNC qo'yiladi
+    if queue.full():
+        while not queue.empty():
+            queue.get_nowait()
+        event = RESYNC
+    queue.put_nowait(event)
+
+
+class MemoryBroker:
+    # bitta process (dev, testlar) uchun: publish darhol shu workerdagi hubga tushadi
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def publish(self, event):
+        self.hub.dispatch(event)
+
+    def listen(self):
+        pass
+
+
+class RedisBroker:
+    # har bir worker Redis kanaliga yozadi va bitta fon threadida shu kanalni tinglaydi
+
+    def __init__(self, hub):
+        self.hub = hub
+        self.redis = get_redis()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def publish(self, event):
+        self.redis.publish(CHANNEL, json.dumps(event))
+
+    def listen(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='spot-events-listener', daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+                for message in pubsub.listen():
+                    self.hub.dispatch(json.loads(message['data']))
+            except Exception:
+                logger.exception("Redis pub/sub uzildi, qayta ulanilmoqda")
+                time.sleep(1)
+
+
+def zone_events(changes):
+    events = {}
+    for change in changes:
+        event = events.setdefault(change.zone_id, {'zone': change.zone_id, 'available_delta': 0, 'spots': []})
+        event['available_delta'] += int(change.new_status == FREE_STATUS) - int(change.old_status == FREE_STATUS)
+        event['spots'].append({'id': change.spot_id, 'spot_type': change.spot_type, 'status': change.new_status})
+    return list(events.values())
+
+
+hub = Hub()
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = RedisBroker(hub) if getattr(settings, 'PUSH_BACKEND', 'redis') == 'redis' else MemoryBroker(hub)
+    return _broker
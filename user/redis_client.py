@@ -0,0 +1,11 @@
+from django.conf import settings
+from redis import Redis, ConnectionPool
+
+_pool = None
+
+
+def get_redis():
+    global _pool
+    if _pool is None:
+        _pool = ConnectionPool(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB)
+    return Redis(connection_pool=_pool)
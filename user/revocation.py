@@ -0,0 +1,147 @@
+import hashlib
+import math
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.utils import timezone as dj_timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from user.models import RevokedToken
+
+
+class BloomFilter:
+    # "yo'q" javobi aniq, "bor" javobi REVOCATION_FALSE_POSITIVE_RATE ehtimol bilan xato bo'lishi mumkin
+    __slots__ = ('size', 'hashes', 'bits')
+
+    def __init__(self, capacity, error_rate):
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 64)
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _hash(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+    def add(self, value):
+        first, second = self._hash(value)
+        for index in range(self.hashes):
+            position = (first + index * second) % self.size
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        # ko'p tokenlar bekor qilinmagan - birinchi bo'sh bitda to'xtaymiz
+        first, second = self._hash(value)
+        size, bits = self.size, self.bits
+        for index in range(self.hashes):
+            position = (first + index * second) % size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+def _cache_key(jti):
+    return f'revoked:{jti}'
+
+
+class RevocationList:
+    # har bir worker xotirasida Bloom filter; DB dan har REVOCATION_REFRESH_SECONDS da faqat yangi qatorlar o'qiladi
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.last_id = 0
+        # (vaqt, last_id) tarixi: refresh REVOCATION_REFRESH_MARGIN oldingi last_id dan qayta o'qiydi
+        self.history = deque()
+        self.refreshed_at = self.rebuilt_at = 0.0
+
+    def rebuild(self):
+        last_id = RevokedToken.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        jtis = list(RevokedToken.objects.filter(id__lte=last_id, expires_at__gt=dj_timezone.now())
+                    .values_list('jti', flat=True))
+        # qo'shimcha joy: keyingi rebuildgacha yangi bekor qilishlar ham sig'sin
+        bloom = BloomFilter(max(len(jtis) * 2, getattr(settings, 'REVOCATION_MIN_CAPACITY', 10000)),
+                            getattr(settings, 'REVOCATION_FALSE_POSITIVE_RATE', 0.01))
+        for jti in jtis:
+            bloom.add(jti)
+        self.bloom, self.last_id = bloom, last_id
+        self.refreshed_at = self.rebuilt_at = time.monotonic()
+        self.history = deque([(self.rebuilt_at, last_id)])
+
+    def refresh(self):
+        # id lar commit tartibida emas: kechikib commit bo'lgan kichik id ham ko'rinsin deb oxirgi
+        # REVOCATION_REFRESH_MARGIN sekund ichida ko'rilgan id lardan boshlab qayta o'qiladi (bloom.add takror zararsiz)
+        now = time.monotonic()
+        margin = getattr(settings, 'REVOCATION_REFRESH_MARGIN', 60)
+        while len(self.history) > 1 and self.history[1][0] <= now - margin:
+            self.history.popleft()
+        floor = self.history[0][1] if self.history else self.last_id
+        self.history.append((now, self.last_id))
+        for row_id, jti in RevokedToken.objects.filter(id__gt=floor).order_by('id').values_list('id', 'jti'):
+            self.bloom.add(jti)
+            self.last_id = max(self.last_id, row_id)
+        self.refreshed_at = now
+
+    def _ensure(self):
+        now = time.monotonic()
+        if self.bloom is not None and now - self.refreshed_at < getattr(settings, 'REVOCATION_REFRESH_SECONDS', 5):
+            return
+        # bitta thread yangilaydi, qolganlari eski filter bilan davom etadi
+        if not self.lock.acquire(blocking=self.bloom is None):
+            return
+        try:
+            if self.bloom is None or now - self.rebuilt_at >= getattr(settings, 'REVOCATION_REBUILD_SECONDS', 3600):
+                self.rebuild()
+            elif now - self.refreshed_at >= getattr(settings, 'REVOCATION_REFRESH_SECONDS', 5):
+                self.refresh()
+        finally:
+            self.lock.release()
+
+    def is_revoked(self, jti):
+        self._ensure()
+        if jti not in self.bloom:
+            return False
+        # filter "bor" dedi: keshdan (Redis backendda Redis), bo'lmasa DB dan aniqlanadi
+        revoked = cache.get(_cache_key(jti))
+        if revoked is None:
+            revoked = RevokedToken.objects.filter(jti=jti).exists()
+            # manfiy javob (false positive) qisqa saqlanadi - keyin bekor qilinsa tez ko'rinsin
+            timeout = getattr(settings, 'REVOCATION_CACHE_TTL', 300) if revoked else \
+                getattr(settings, 'REVOCATION_REFRESH_SECONDS', 5)
+            cache.set(_cache_key(jti), revoked, timeout)
+        return revoked
+
+    def add(self, jti):
+        if self.bloom is not None:
+            self.bloom.add(jti)
+
+
+revocations = RevocationList()
+
+
+def revoke_token(token, user=None):
+    jti = token[api_settings.JTI_CLAIM]
+    expires_at = datetime.fromtimestamp(token['exp'], tz=timezone.utc)
+    try:
+        RevokedToken.objects.get_or_create(jti=jti, defaults={'expires_at': expires_at, 'user': user})
+    except IntegrityError:
+        pass
+    ttl = max(int(token['exp'] - time.time()), 1)
+    cache.set(_cache_key(jti), True, ttl)
+    revocations.add(jti)
+
+
+def is_revoked(token):
+    if not getattr(settings, 'JWT_REVOCATION', True):
+        return False
+    jti = token.get(api_settings.JTI_CLAIM)
+    return jti is not None and revocations.is_revoked(jti)
+
+
+def purge_expired():
+    return RevokedToken.objects.filter(expires_at__lte=dj_timezone.now()).delete()[0]
@@ -0,0 +1,137 @@
+import re
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+from django.db.models.functions import Lower, Collate
+
+from user.models import User
+
+PHONE_QUERY = re.compile(r'[\d\s()+-]+')
+
+
+def search_terms(q):
+    # username/email kichik harfda solishtiriladi, telefon faqat raqamlar bo'yicha (+998 90 ... ham topiladi)
+    q = q.strip()
+    phone = re.sub(r'\D', '', q) if PHONE_QUERY.fullmatch(q) else ''
+    return q.lower(), phone
+
+
+def search_keys(username, email, phone):
+    return [key for key in (username.lower(), (email or '').lower(), phone) if key]
+
+
+def matches(user, text, phone):
+    return any(key.startswith(text) or (phone and key.startswith(phone))
+               for key in search_keys(user.username, user.email, user.phone))
+
+
+class PrefixIndex:
+    # username/email/phone kalitlari bitta saralangan massivda: prefix qidiruv bisect bilan O(log n + limit)
+
+    def __init__(self, rows):
+        # user_id -> kalitlari: qayta saqlanganda eski kalitlarni topib olib tashlash uchun
+        self.user_keys = {user_id: search_keys(username, email, phone) for user_id, username, email, phone in rows}
+        entries = sorted((key, user_id) for user_id, keys in self.user_keys.items() for key in keys)
+        self.keys = [key for key, _ in entries]
+        self.ids = [user_id for _, user_id in entries]
+        self.lock = threading.Lock()
+
+    def add(self, user):
+        keys = search_keys(user.username, user.email, user.phone)
+        with self.lock:
+            old_keys = self.user_keys.get(user.pk, [])
+            if old_keys == keys:
+                return
+            for key in old_keys:
+                self._remove(key, user.pk)
+            for key in keys:
+                position = bisect_right(self.keys, key)
+                self.keys.insert(position, key)
+                self.ids.insert(position, user.pk)
+            self.user_keys[user.pk] = keys
+
+    def _remove(self, key, user_id):
+        position = bisect_left(self.keys, key)
+        while position < len(self.keys) and self.keys[position] == key:
+            if self.ids[position] == user_id:
+                del self.keys[position]
+                del self.ids[position]
+                return
+            position += 1
+
+    def _scan(self, prefix, limit):
+        found = []
+        with self.lock:
+            position = bisect_left(self.keys, prefix)
+            while position < len(self.keys) and len(found) < limit and self.keys[position].startswith(prefix):
+                found.append((self.keys[position], self.ids[position]))
+                position += 1
+        return found
+
+    def search(self, text, phone, limit):
+        found = self._scan(text, limit)
+        if phone and phone != text:
+            found += self._scan(phone, limit)
+        return _top_ids(found, limit)
+
+
+def _top_ids(found, limit):
+    ids = []
+    for _, user_id in sorted(found):
+        if user_id not in ids:
+            ids.append(user_id)
+    return ids[:limit]
+
+
+def _database_ids(text, phone, limit):
+    # PostgreSQL: 0015 dagi (lower(x) COLLATE "C") B-tree indekslari LIKE 'q%' va ORDER BY ni ham qoplaydi,
+    # shuning uchun har bir subquery indeks bo'yicha limit qatorni o'qib to'xtaydi
+    prefixes = [(Lower('username'), text), (Lower('email'), text)]
+    if phone:
+        prefixes.append((F('phone'), phone))
+    queries = [User.objects.annotate(key=Collate(expression, 'C')).filter(key__startswith=value)
+               .order_by('key').values_list('key', 'id')[:limit] for expression, value in prefixes]
+    return _top_ids(queries[0].union(*queries[1:], all=True), limit)
+
+
+_lock = threading.Lock()
+_index = None
+_built_at = 0.0
+
+
+def build_index():
+    return PrefixIndex(User.objects.values_list('id', 'username', 'email', 'phone').iterator(chunk_size=5000))
+
+
+def get_index():
+    global _index, _built_at
+    ttl = getattr(settings, 'USER_SEARCH_INDEX_TTL', 300)
+    index = _index
+    if index is not None and time.monotonic() - _built_at < ttl:
+        return index
+    with _lock:
+        if _index is None or time.monotonic() - _built_at >= ttl:
+            _index = build_index()
+            _built_at = time.monotonic()
+        return _index
+
+
+def index_user(user):
+    # shu workerdagi indeksga darhol yoziladi (eski kalitlar almashtiriladi); boshqa workerlarda eskirgan
+    # kalitlar search() da DB qiymati bilan tekshirib tashlanadi
+    if _index is not None:
+        _index.add(user)
+
+
+def search_users(q, limit):
+    text, phone = search_terms(q)
+    if connection.vendor == 'postgresql':
+        ids = _database_ids(text, phone, limit)
+    else:
+        ids = get_index().search(text, phone, limit)
+    users = User.objects.in_bulk(ids)
+    return [users[user_id] for user_id in ids if user_id in users and matches(users[user_id], text, phone)]
@@ -1,15 +1,18 @@
 import re
-import random
-from redis import Redis
-from datetime import timedelta
 from user.models import User, ParkingZone, ParkingSpot, Payment, Reservation
-from rest_framework.utils import json
-from django.core.mail import send_mail
 from root.settings import EMAIL_HOST_USER
+from django.contrib.auth.validators import UnicodeUsernameValidator
 from rest_framework.fields import CharField
 from rest_framework.exceptions import ValidationError
-from django.contrib.auth.hashers import make_password
 from rest_framework.serializers import ModelSerializer, Serializer
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.tokens import RefreshToken
+from user.hashing import hash_password
+from user.importing import taken_values, UNIQUE_FIELDS
+from user.mailer import queue_mail
+from user.otp import get_otp_store, generate_code, EXPIRED, INVALID
+from user.revocation import is_revoked
 from rest_framework import serializers
 from django.utils.dateparse import parse_datetime
 import datetime
@@ -21,37 +24,34 @@ class RegisterModelSerializer(ModelSerializer):
         model = User
         fields = ('id', 'username', 'email', 'password', 'phone', 'first_name', 'last_name')
         extra_kwargs = {
-            "password": {"write_only": True}
+            "password": {"write_only": True},
+            # unikallik validate() da bitta so'rov bilan tekshiriladi
+            "username": {"validators": [UnicodeUsernameValidator()]},
+            "phone": {"validators": []},
         }
 
     def create(self, validated_data):
         password = validated_data.pop("password")
         user = User(**validated_data)
-        user.set_password(password)
+        # parol faqat shu yerda, bir marta hash qilinadi
+        user.password = hash_password(password)
         user.save()
         return user
 
-    def validate_password(self, value):
-        return make_password(value)
-
-    def validate_username(self, value):
-        if User.objects.filter(username=value).exists():
-            raise ValidationError('Username already exists')
-        return value
-
-    def validate_email(self, value):
-        if User.objects.filter(email=value).exists():
-            raise ValidationError('Email already exists')
-        return value
+    def validate(self, attrs):
+        taken = taken_values(**{field: [attrs.get(field)] for field in UNIQUE_FIELDS})
+        errors = {}
+        for field in UNIQUE_FIELDS:
+            if attrs.get(field) and attrs[field] in taken[field]:
+                errors[field] = [f'{field.capitalize()} already exists']
+        if errors:
+            raise ValidationError(errors)
+        return attrs
 
     def validate_phone(self, value):
         # Remove all non-digits
         cleaned = re.sub(r'\D', '', value)
 
-        # Check if phone exists
-        if User.objects.filter(phone=cleaned).exists():
-            raise ValidationError('Phone already exists')
-
         # Only numbers allowed
         if value != cleaned:
             raise ValidationError('Phone number must contain only digits')
@@ -60,6 +60,37 @@ class RegisterModelSerializer(ModelSerializer):
         return cleaned
 
 
+class UserImportSerializer(RegisterModelSerializer):
+    password = None
+
+    class Meta(RegisterModelSerializer.Meta):
+        fields = ('username', 'email', 'phone', 'first_name', 'last_name')
+
+    def validate(self, attrs):
+        # unikallik import_users da har chunk uchun bitta so'rov bilan tekshiriladi
+        return attrs
+
+
+class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        # JWT_TRUST_ROLE_CLAIM yoqilsa IsAdmin User ni DB dan o'qimasdan shu claim bilan ishlaydi
+        token['role'] = user.role
+        return token
+
+
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        if is_revoked(RefreshToken(attrs['refresh'])):
+            raise InvalidToken("Token is revoked")
+        return super().validate(attrs)
+
+
+class LogoutSerializer(Serializer):
+    refresh = CharField(required=False)
+
+
 class ForgotSerializer(Serializer):
     email = CharField(max_length=255)
 
@@ -70,18 +101,14 @@ class ForgotSerializer(Serializer):
         return value
 
     def send_code(self, email):
-        code = random.randint(10**5, 10**6)
-        redis = Redis(decode_responses=True)
-        data = {"code": code, "status": "False"}
-        data_str = json.dumps(data)
-        redis.mset({email: data_str })
-        redis.expire(email, time=timedelta(minutes=1))
-        send_mail(
+        code = generate_code()
+        get_otp_store().issue(email, code)
+        # SMTP so'rov ichida kutilmaydi - xat fon threadida yuboriladi
+        queue_mail(
             subject='Verification Code!!!',
             message=f"{code}",
             from_email=EMAIL_HOST_USER,
             recipient_list=[email],
-            fail_silently=False,
         )
 
 
@@ -90,23 +117,11 @@ class VerifyOTPSerializer(Serializer):
     code = CharField(max_length=10)
 
     def validate(self, attrs):
-        redis = Redis()
-        email = attrs.get('email')
-        code = attrs.get('code')
-
-        data_list = redis.mget(email)[0]
-        if not data_list or not data_list[0]:
+        result = get_otp_store().verify(attrs.get('email'), attrs.get('code'))
+        if result == EXPIRED:
             raise ValidationError("Code expired!")
-
-        data_dict = json.loads(data_list)  # <-- bu yer to'g'rilandi
-
-        verify_code = str(data_dict.get('code'))
-        if str(verify_code) != str(code):
+        if result == INVALID:
             raise ValidationError("Code xato!")
-
-        redis.set(email, json.dumps({'status': "True"}))
-        redis.expire(email, timedelta(minutes=2))
-
         return attrs
     # def validate(self, attrs):
     #     redis = Redis()
@@ -129,13 +144,10 @@ class ChangePasswordSerializer(Serializer):
     password = CharField(max_length=255)
     confirm_password = CharField(max_length=255)
     def validate_email(self, value):
-        redis = Redis()
-        data_str = redis.mget(value)[0]
-        if data_str == None or len(data_str) == 0:
+        verified = get_otp_store().is_verified(value)
+        if verified is None:
             raise ValidationError("Code vaqti tugadi!")
-        data_dict = json.loads(data_str)
-        status = data_dict.get('status')
-        if status == "False":
+        if not verified:
             raise ValidationError("Oldin email tasdiqlansin!")
         return value
 
@@ -144,7 +156,7 @@ class ChangePasswordSerializer(Serializer):
         confirm_password = attrs.get('confirm_password')
         if password != confirm_password:
             raise ValidationError("Password Confirm passwordga teng emas!")
-        attrs['password'] = make_password(password)
+        attrs['password'] = hash_password(password)
         return attrs
 
     def save(self, **kwargs):
@@ -167,13 +179,19 @@ class ProfileModelSerializer(ModelSerializer):
 
 
 
+class ProfileSearchQuerySerializer(Serializer):
+    q = serializers.CharField(min_length=1, max_length=150)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+
 class ParkingZoneModelSerializer(ModelSerializer):
     created_at = serializers.DateTimeField(required=True)
+    available_spots = serializers.IntegerField(source='live_available_spots', read_only=True)
 
     class Meta:
         model = ParkingZone
         fields = ('id', 'name', 'created_at', 'total_spots', 'available_spots', 'address', 'coordinates')
-        read_only_fields = ('created_at', 'id')
+        read_only_fields = ('created_at', 'id', 'available_spots')
 
     def validate_created_at(self, value):
         if isinstance(value, str):
@@ -203,12 +221,29 @@ class ParkingZoneDetailSerializer(serializers.ModelSerializer):
     # hourly_rate = serializers.DecimalField(max_digits=10, decimal_places=2)
     # daily_rate = serializers.DecimalField(max_digits=10, decimal_places=2)
     # monthly_rate = serializers.DecimalField(max_digits=10, decimal_places=2)
+    available_spots = serializers.IntegerField(source='live_available_spots', read_only=True)
 
     class Meta:
         model = ParkingZone
         fields = (
             'id', 'name', 'address', 'coordinates', 'total_spots', 'available_spots', 'created_at'
         )
+        # available_spots counter orqali yuritiladi (user/counters.py)
+        read_only_fields = ('id', 'available_spots', 'created_at')
+
+
+class ParkingZoneNearbyQuerySerializer(Serializer):
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lon = serializers.FloatField(min_value=-180, max_value=180)
+    radius = serializers.FloatField(min_value=0.01, max_value=50, default=2)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+
+class ParkingZoneNearbySerializer(ParkingZoneModelSerializer):
+    distance = serializers.FloatField(read_only=True)
+
+    class Meta(ParkingZoneModelSerializer.Meta):
+        fields = ParkingZoneModelSerializer.Meta.fields + ('latitude', 'longitude', 'distance')
 
 
 class ParkingSpotSerializer(ModelSerializer):
@@ -225,6 +260,26 @@ class ParkingSpotSerializer(ModelSerializer):
 
 
 
+class ParkingSpotChangeSerializer(ParkingSpotSerializer):
+    class Meta(ParkingSpotSerializer.Meta):
+        fields = ParkingSpotSerializer.Meta.fields + ['version']
+
+
+class ParkingZoneChangeSerializer(ParkingZoneModelSerializer):
+    class Meta(ParkingZoneModelSerializer.Meta):
+        fields = ParkingZoneModelSerializer.Meta.fields + ('latitude', 'longitude', 'version')
+
+
+class ChangeFeedQuerySerializer(Serializer):
+    since = serializers.IntegerField(min_value=0, default=0)
+    limit = serializers.IntegerField(min_value=1, max_value=5000, default=500)
+
+
+class SpotAllocateSerializer(Serializer):
+    zone = serializers.PrimaryKeyRelatedField(queryset=ParkingZone.objects.all())
+    spot_type = serializers.ChoiceField(choices=ParkingSpot.SpotType.choices, default=ParkingSpot.SpotType.REGULAR)
+
+
 class PaymentSerializer(ModelSerializer):
     class Meta:
         model = Payment
@@ -0,0 +1,85 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver, Signal
+
+from user.authentication import forget_user
+from user.availability import get_availability
+from user.caching import invalidate
+from user.models import User, ParkingZone, ParkingSpot, ChangeTombstone, version_expression
+from user.push import get_broker, zone_events
+from user.search import index_user
+from user.spatial import invalidate_index
+
+# tranzaksiya commit bo'lgandan keyin yuboriladi; changes - user.counters.SpotChange lar ro'yxati
+spot_status_changed = Signal()
+
+
+@receiver([post_save, post_delete], sender=ParkingZone)
+def zone_changed(sender, instance, **kwargs):
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and 'coordinates' not in update_fields:
+        return
+    invalidate_index()
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def index_saved_user(sender, instance, **kwargs):
+    index_user(instance)
+
+
+@receiver([post_save, post_delete], sender=ParkingZone)
+def invalidate_zone_cache(sender, instance, **kwargs):
+    invalidate('zones')
+
+
+@receiver(spot_status_changed)
+def refresh_zone_counts(sender, changes, **kwargs):
+    # available_spots F() bilan yangilanadi (post_save yo'q) - bo'sh joylar soni o'zgarsa zona keshi ham eskiradi
+    free = ParkingSpot.StatusChoices.EMPTY
+    if any((change.new_status == free) != (change.old_status == free) for change in changes):
+        invalidate('zones')
+
+
+@receiver(spot_status_changed)
+def update_availability(sender, changes, **kwargs):
+    get_availability().apply(changes)
+
+
+@receiver(post_delete, sender=ParkingSpot)
+def spot_tombstone(sender, instance, **kwargs):
+    # o'chirish bilan bitta tranzaksiyada: spots/changes feed mijozlari joyni o'chirilgan deb ko'radi
+    ChangeTombstone.objects.create(kind=ChangeTombstone.KindChoices.SPOT, object_id=instance.pk,
+                                   version=version_expression())
+
+
+@receiver(post_delete, sender=ParkingZone)
+def zone_tombstone(sender, instance, **kwargs):
+    ChangeTombstone.objects.create(kind=ChangeTombstone.KindChoices.ZONE, object_id=instance.pk,
+                                   version=version_expression())
+
+
+@receiver(post_delete, sender=ParkingSpot)
+def forget_deleted_spot(sender, instance, **kwargs):
+    # o'chirilgan joy bitmapda bo'sh bo'lib qolmasin (zona o'chirilganda cascade ham shu yerdan o'tadi)
+    from user.counters import SpotChange
+
+    change = SpotChange(instance.pk, instance.zone_id, instance.spot_type, instance.status, None)
+    transaction.on_commit(lambda: get_availability().apply([change]), robust=True)
+
+
+@receiver(post_delete, sender=ParkingZone)
+def forget_deleted_zone(sender, instance, **kwargs):
+    zone_id = instance.pk
+    transaction.on_commit(lambda: get_availability().drop_zone(zone_id), robust=True)
+
+
+@receiver(spot_status_changed)
+def publish_changes(sender, changes, **kwargs):
+    broker = get_broker()
+    for event in zone_events(changes):
+        broker.publish(event)
@@ -0,0 +1,101 @@
+import math
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+from user.models import ParkingZone
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class ZoneGridIndex:
+    # Zonalar cell_size graduslik kataklarga bo'linadi, qidiruv faqat radius qoplagan kataklarni ko'radi
+
+    def __init__(self, points, cell_size):
+        self.cell_size = cell_size
+        self.cells = defaultdict(list)
+        self.size = 0
+        for zone_id, lat, lon in points:
+            self.cells[self._cell(lat, lon)].append((lat, lon, zone_id))
+            self.size += 1
+
+    def _cell(self, lat, lon):
+        return math.floor(lat / self.cell_size), math.floor(_wrap_lon(lon) / self.cell_size)
+
+    def _lon_cells(self, lon, dlon):
+        # antimeridiandan o'tgan oraliq ikkiga bo'linadi; dlon 180 bilan cheklangani uchun kataklar soni <= 360/cell_size
+        if dlon >= 180:
+            ranges = [(-180, 180)]
+        else:
+            low, high = _wrap_lon(lon - dlon), _wrap_lon(lon + dlon)
+            ranges = [(low, high)] if low <= high else [(low, 180), (-180, high)]
+        cells = set()
+        for low, high in ranges:
+            cells.update(range(math.floor(low / self.cell_size), math.floor(high / self.cell_size) + 1))
+        return cells
+
+    def nearby(self, lat, lon, radius_km, limit=None):
+        dlat = radius_km / KM_PER_DEGREE
+        # qutb yaqinida cos(lat) -> 0: uzunlik bo'yicha oraliq butun aylanadan (180) oshmaydi
+        dlon = min(radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6)), 180)
+        xs = range(math.floor(max(lat - dlat, -90) / self.cell_size), math.floor(min(lat + dlat, 90) / self.cell_size) + 1)
+        ys = self._lon_cells(lon, dlon)
+
+        if len(xs) * len(ys) > len(self.cells):
+            # oraliq katta (qutb atrofi): bo'sh kataklarni aylanmasdan faqat mavjudlari tekshiriladi
+            cells = [points for (x, y), points in self.cells.items() if x in xs and y in ys]
+        else:
+            cells = [self.cells[x, y] for x in xs for y in ys if (x, y) in self.cells]
+
+        found = []
+        for points in cells:
+            for zone_lat, zone_lon, zone_id in points:
+                distance = haversine_km(lat, lon, zone_lat, zone_lon)
+                if distance <= radius_km:
+                    found.append((distance, zone_id))
+        found.sort()
+        return found[:limit] if limit else found
+
+
+def _wrap_lon(lon):
+    # [-180, 180) oralig'iga
+    return (lon + 180) % 360 - 180
+
+
+_lock = threading.Lock()
+_index = None
+_built_at = 0.0
+
+
+def build_index():
+    points = (ParkingZone.objects.filter(latitude__isnull=False, longitude__isnull=False)
+              .values_list('id', 'latitude', 'longitude'))
+    return ZoneGridIndex(points.iterator(chunk_size=5000), getattr(settings, 'SPATIAL_INDEX_CELL_DEGREES', 0.01))
+
+
+def get_index():
+    global _index, _built_at
+    ttl = getattr(settings, 'SPATIAL_INDEX_TTL', 60)
+    index = _index
+    if index is not None and time.monotonic() - _built_at < ttl:
+        return index
+    with _lock:
+        if _index is None or time.monotonic() - _built_at >= ttl:
+            _index = build_index()
+            _built_at = time.monotonic()
+        return _index
+
+
+def invalidate_index():
+    # boshqa workerlar indeksni SPATIAL_INDEX_TTL tugagach qayta quradi
+    global _index
+    _index = None
@@ -0,0 +1,45 @@
+import json
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+from user.fastpath import compile_serializer
+
+
+def wants_stream(request):
+    return request.query_params.get('stream', '').lower() in ('1', 'true')
+
+
+def _json_items(queryset, serializer_class, chunk_size):
+    # queryset butun holda xotiraga olinmaydi: har chunk alohida serializatsiya qilinib yoziladi
+    encoder = JSONEncoder(ensure_ascii=False)
+    plan = compile_serializer(serializer_class)
+    if plan is not None:
+        queryset, represent = plan.values(queryset), plan.represent
+    else:
+        represent = lambda chunk: serializer_class(chunk, many=True).data
+
+    chunk, separator = [], ''
+    for instance in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(instance)
+        if len(chunk) == chunk_size:
+            yield separator + ','.join(encoder.encode(item) for item in represent(chunk))
+            chunk, separator = [], ','
+    if chunk:
+        yield separator + ','.join(encoder.encode(item) for item in represent(chunk))
+
+
+def stream_json_list(queryset, serializer_class, envelope=None, key='data'):
+    chunk_size = getattr(settings, 'STREAM_CHUNK_SIZE', 500)
+
+    def generate():
+        if envelope is None:
+            yield '['
+        else:
+            # {"status": 200, "data": [ ... ]} - oddiy javob bilan bir xil ko'rinish
+            yield json.dumps(envelope)[:-1] + f', {json.dumps(key)}: ['
+        yield from _json_items(queryset, serializer_class, chunk_size)
+        yield ']' if envelope is None else ']}'
+
+    return StreamingHttpResponse(generate(), content_type='application/json')
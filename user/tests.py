@@ -1,8 +1,96 @@
+import asyncio
+import json
+import threading
+import time
+from datetime import timedelta
+
 import pytest
 from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.mail import EmailMessage
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework.test import APIClient
 
-from user.models import User
+from user.authentication import claims_user, local_users
+from user.revocation import BloomFilter, RevocationList, revocations
+from user.availability import get_availability, LocalAvailability, RedisAvailability
+from user.caching import SingleFlight
+from user.counters import adjust_available, change_spot_status, set_zone_shards, with_live_counters, SpotChange
+from user.fastpath import compile_serializer, serialize_rows
+from user.hashing import HashingExecutor, HashingBusy, SharedSlots
+from user import ingest
+from user.ingest import SensorEventBuffer, _spot_pairs
+from user.mailer import MailQueue, MailQueueFull, get_mail_queue
+from user.metrics import Registry
+from user.pagination import encode_cursor
+from user.middleware import QueryInstrumentationMiddleware, fingerprint
+from user.push import Hub, MemoryBroker, RESYNC, zone_events
+from user import models as user_models
+from user.models import User, ParkingZone, ParkingSpot, Reservation, Payment, ChangeVersion, RevokedToken
+from user.renderers import FastJSONRenderer
+from user.search import PrefixIndex
+from user.spatial import ZoneGridIndex
+from user.throttling import get_token_bucket
+from user.serializers import ParkingSpotSerializer, ReservationSerializer, PaymentSerializer, \
+    CustomTokenObtainPairSerializer
+from user.views import ReservationListCreateAPIView, PaymentListCreateAPIView
+
+
+def assert_query_budget(budget, request, *args, **kwargs):
+    # view so'rovlari soni budgetdan oshsa yoki sahifa hajmiga qarab o'ssa test yiqiladi
+    counts = []
+    for page_size in (1, 50):
+        with CaptureQueriesContext(connection) as queries:
+            response = request(*args, **{**kwargs, 'data': {**kwargs.get('data', {}), 'page_size': page_size}})
+        assert response.status_code == 200
+        counts.append(len(queries))
+    assert counts[0] == counts[1], f"so'rovlar soni sahifa hajmiga bog'liq: {counts}"
+    assert counts[1] <= budget, f"{counts[1]} ta so'rov, budget {budget}"
+
+
+@pytest.fixture(autouse=True)
+def local_backends(settings):
+    # testlar Redis siz: kesh va throttle bucketlari process ichida
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    settings.THROTTLE_BACKEND = 'memory'
+    settings.AVAILABILITY_BACKEND = 'local'
+    settings.PUSH_BACKEND = 'memory'
+
+
+@pytest.fixture
+def driver(db):
+    return User.objects.create(username='driver', email='driver@example.com', phone='998901112233')
+
+
+@pytest.fixture
+def driver_client(driver):
+    client = APIClient()
+    client.force_authenticate(driver)
+    return client
+
+
+@pytest.fixture
+def admin_client(db):
+    client = APIClient()
+    client.force_authenticate(User.objects.create(username='admin', email='admin@example.com', phone='998900000001',
+                                                  role=User.RoleType.ADMIN))
+    return client
+
+
+@pytest.fixture
+def make_zone(db):
+    # 'Mall' zonasi va undagi A001..A00n joylar (har biri save() orqali - versiya oladi)
+    def make(spots=0, name='Mall', coordinates='41.3,69.2', available_spots=None):
+        zone = ParkingZone.objects.create(name=name, address='x', coordinates=coordinates, total_spots=spots,
+                                          available_spots=spots if available_spots is None else available_spots)
+        for i in range(1, spots + 1):
+            ParkingSpot.objects.create(zone=zone, spot_number=f'A{i:03d}')
+        return zone
+    return make
 
 
 class TestAuth:
@@ -89,3 +177,861 @@ class TestAuth:
 
 
 
+@pytest.mark.django_db
+class TestZoneCounters:
+    @pytest.fixture
+    def zone(self, make_zone):
+        return make_zone(3)
+
+    def test_created_spot_is_free_and_counted(self, driver_client, zone):
+        response = driver_client.post('/auth/v1/spots/', {'zone': zone.pk, 'spot_number': 'B001', 'spot_type': 'regular',
+                                                          'payment_method': Payment.PaymentMethodChoices.values[0]},
+                                      format='json')
+        assert response.status_code == 201
+        assert ParkingSpot.objects.get(spot_number='B001').status == ParkingSpot.StatusChoices.EMPTY
+        zone.refresh_from_db()
+        assert zone.live_available_spots == 4
+
+    def test_total_spots_edit_recomputes_counters(self, admin_client, zone):
+        set_zone_shards(zone, 2)
+        adjust_available(zone.pk, 5, zone.shard_count)
+        response = admin_client.patch(f'/auth/v1/parking-zones/detail/{zone.pk}', {'total_spots': 2}, format='json')
+        assert response.json()['available_spots'] == 2
+        zone.refresh_from_db()
+        assert zone.live_available_spots == 2
+
+    def test_status_transitions(self, zone):
+        spot = zone.parking_spots.first()
+        change_spot_status(spot, ParkingSpot.StatusChoices.OCCUPIED)
+        zone.refresh_from_db()
+        assert zone.available_spots == 2
+
+        change_spot_status(spot, ParkingSpot.StatusChoices.RESERVED)
+        zone.refresh_from_db()
+        assert zone.available_spots == 2
+
+        change_spot_status(spot, ParkingSpot.StatusChoices.EMPTY)
+        zone.refresh_from_db()
+        assert zone.available_spots == 3
+
+    def test_reconcile(self, zone):
+        ParkingSpot.objects.filter(spot_number='A001').update(status=ParkingSpot.StatusChoices.OCCUPIED)
+        ParkingZone.objects.filter(pk=zone.pk).update(available_spots=0)
+        call_command('reconcile_zone_counters')
+        zone.refresh_from_db()
+        assert zone.available_spots == 2
+
+    def test_decrement_below_zero_is_logged(self, zone, caplog):
+        ParkingZone.objects.filter(pk=zone.pk).update(available_spots=1)
+        adjust_available(zone.pk, -2)
+        zone.refresh_from_db()
+        assert zone.available_spots == 0
+        assert any('drift' in record.getMessage() for record in caplog.records)
+
+
+@pytest.mark.django_db
+class TestShardedCounters:
+    @pytest.fixture
+    def zone(self, make_zone):
+        zone = make_zone(4)
+        call_command('set_zone_shards', zone.pk, 4)
+        return zone
+
+    def test_writes_go_to_shards(self, zone):
+        for spot in zone.parking_spots.all()[:3]:
+            change_spot_status(spot, ParkingSpot.StatusChoices.OCCUPIED)
+        zone.refresh_from_db()
+        assert zone.available_spots == 4
+        assert zone.live_available_spots == 1
+        assert with_live_counters(ParkingZone.objects.all()).get(pk=zone.pk).live_available_spots == 1
+
+        call_command('fold_zone_counters')
+        zone.refresh_from_db()
+        assert zone.available_spots == 1
+        assert zone.live_available_spots == 1
+
+
+@pytest.mark.django_db
+class TestNearbyZones:
+    def test_nearby_ordered_by_distance(self, driver_client, make_zone):
+        make_zone(1, name='Far', coordinates='41.3300,69.2800')
+        make_zone(1, name='Near', coordinates='41.3115 69.2795')
+        make_zone(1, name='Full', coordinates='41.3112,69.2797', available_spots=0)
+        make_zone(1, name='Other city', coordinates='39.6542,66.9597')
+
+        response = driver_client.get('/auth/v1/parking-zones/nearby', {'lat': 41.3111, 'lon': 69.2797, 'radius': 5})
+        names = [zone['name'] for zone in response.json()['message']]
+        assert names == ['Near', 'Far']
+
+    def test_nearby_stops_after_limit(self, driver_client, make_zone):
+        for i in range(3):
+            make_zone(name=f'Full {i}', coordinates=f'41.31{i},69.28', available_spots=0)
+        for i in range(10):
+            make_zone(name=f'Free {i}', coordinates=f'41.33{i},69.28', available_spots=1)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = driver_client.get('/auth/v1/parking-zones/nearby', {'lat': 41.31, 'lon': 69.28, 'radius': 10, 'limit': 1})
+        assert [zone['name'] for zone in response.json()['message']] == ['Free 0']
+        # limit=1: partiya 2 ta zona - 13 nomzoddan faqat 2 partiya o'qiladi
+        assert len([query for query in queries if 'pending_available' in query['sql']]) == 2
+
+    def test_grid_near_pole_and_antimeridian(self):
+        index = ZoneGridIndex([(1, 89.95, 120.0), (2, 0.0, 179.999), (3, 0.0, -179.999), (4, 0.0, 0.0)], 0.01)
+
+        started = time.monotonic()
+        assert [zone_id for _, zone_id in index.nearby(90, 0, 10)] == [1]
+        assert [zone_id for _, zone_id in index.nearby(89.9, 0, 50)] == [1]
+        assert time.monotonic() - started < 1
+        assert sorted(zone_id for _, zone_id in index.nearby(0.0, 180.0, 1)) == [2, 3]
+
+    def test_nearby_requires_coordinates(self, driver_client):
+        response = driver_client.get('/auth/v1/parking-zones/nearby', {'lat': 100})
+        assert response.status_code == 400
+
+
+@pytest.mark.django_db
+class TestSpotAllocate:
+    def test_allocate_until_full(self, driver_client, make_zone, django_capture_on_commit_callbacks):
+        zone = make_zone(2)
+        ParkingSpot.objects.filter(spot_number='A002').update(spot_type=ParkingSpot.SpotType.ELECTRIC)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = driver_client.post('/auth/v1/spots/allocate', {'zone': zone.pk}, format='json')
+        assert response.status_code == 201
+        assert response.json()['message']['spot']['status'] == ParkingSpot.StatusChoices.RESERVED
+
+        response = driver_client.post('/auth/v1/spots/allocate', {'zone': zone.pk}, format='json')
+        assert response.status_code == 409
+
+        zone.refresh_from_db()
+        assert zone.available_spots == 1
+        assert Reservation.objects.count() == 1
+
+
+@pytest.mark.django_db
+class TestAvailabilityBitmap:
+    def test_bitmap_follows_status_changes(self, driver_client, make_zone, django_capture_on_commit_callbacks):
+        zone = make_zone(3)
+        get_availability().rebuild()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            change_spot_status(zone.parking_spots.get(spot_number='A001'), ParkingSpot.StatusChoices.OCCUPIED)
+
+        response = driver_client.get('/auth/v1/spots/available/', {'zone': zone.pk})
+        assert [spot['spot_number'] for spot in response.json()] == ['A002', 'A003']
+
+        response = driver_client.get(f'/auth/v1/spots/available/{zone.pk}/count/')
+        assert response.json()['message']['by_type'] == {ParkingSpot.SpotType.REGULAR: 2}
+
+        with django_capture_on_commit_callbacks(execute=True):
+            zone.parking_spots.get(spot_number='A002').delete()
+        response = driver_client.get(f'/auth/v1/spots/available/{zone.pk}/count/')
+        assert response.json()['message']['by_type'] == {ParkingSpot.SpotType.REGULAR: 1}
+
+        with django_capture_on_commit_callbacks(execute=True):
+            zone.delete()
+        assert get_availability().ids(zone.pk) == []
+
+    def test_stale_bitmap_does_not_list_taken_spots(self, driver_client, make_zone):
+        zone = make_zone(2)
+        get_availability().rebuild()
+        # boshqa workerdagi o'zgarish: bu workerning bitmapi hali yangilanmagan
+        ParkingSpot.objects.filter(spot_number='A001').update(status=ParkingSpot.StatusChoices.OCCUPIED)
+        response = driver_client.get('/auth/v1/spots/available/', {'zone': zone.pk})
+        assert [spot['spot_number'] for spot in response.json()] == ['A002']
+
+    def test_rebuild_replays_changes_seen_during_scan(self, make_zone, monkeypatch):
+        zone = make_zone(2)
+        spot = zone.parking_spots.get(spot_number='A001')
+        availability = LocalAvailability()
+        scan = list(ParkingSpot.objects.values_list('id', 'zone_id', 'spot_type'))
+
+        def free_spots(zone_ids=None):
+            yield scan[0]
+            availability.apply([SpotChange(spot.pk, zone.pk, spot.spot_type, 'empty', 'occupied')])
+            yield from scan[1:]
+
+        monkeypatch.setattr('user.availability._free_spots', free_spots)
+        availability.rebuild()
+        assert spot.pk not in availability.ids(zone.pk)
+
+    def test_redis_bitmaps_expire_and_skip_exists_on_apply(self, make_zone, settings):
+        fakeredis = pytest.importorskip('fakeredis')
+        settings.AVAILABILITY_REDIS_TTL = 30
+        availability = RedisAvailability.__new__(RedisAvailability)
+        availability.redis = fakeredis.FakeRedis()
+        zone = make_zone(2)
+        availability.ids(zone.pk)
+        assert 0 < availability.redis.ttl('avail:built') <= 30
+
+        availability.redis.delete('avail:built')
+        spot = zone.parking_spots.get(spot_number='A001')
+        availability.apply([SpotChange(spot.pk, zone.pk, spot.spot_type, 'empty', 'occupied')])
+        # apply qayta qurmaydi, faqat bitni o'zgartiradi
+        assert not availability.redis.exists('avail:built')
+
+
+@pytest.mark.django_db
+class TestSensorBulk:
+    @pytest.fixture(autouse=True)
+    def synchronous(self, settings):
+        settings.SENSOR_DEBOUNCE_SECONDS = 0
+
+    def test_bulk_status_events(self, driver_client, make_zone):
+        zone = make_zone(3)
+
+        response = driver_client.post('/auth/v1/spots/status/bulk/', [
+            {'zone': zone.pk, 'spot_number': 'A001', 'status': 'empty'},
+            {'zone': zone.pk, 'spot_number': 'A002', 'status': 'empty'},
+            {'zone': zone.pk, 'spot_number': 'A002', 'status': 'occupied'},
+            {'zone': zone.pk, 'spot_number': 'A999', 'status': 'occupied'},
+            {'zone': zone.pk, 'spot_number': 'A003', 'status': 'parked'},
+        ], format='json')
+        stats = response.json()['message']
+        assert (stats['updated'], stats['unchanged'], stats['unknown'], stats['invalid']) == (1, 1, 1, 1)
+
+        zone.refresh_from_db()
+        assert zone.available_spots == 2
+        assert ParkingSpot.objects.get(zone=zone, spot_number='A002').status == 'occupied'
+
+    def test_bulk_ndjson(self, driver_client, make_zone):
+        zone = make_zone(1)
+        body = f'{{"zone": {zone.pk}, "spot_number": "A001", "status": "occupied"}}\n'
+        response = driver_client.post('/auth/v1/spots/status/bulk/', body, content_type='application/x-ndjson')
+        assert response.json()['message']['updated'] == 1
+
+    def test_only_reported_pairs_are_locked(self, driver_client, make_zone):
+        zones = [make_zone(3, name=f'Mall {i}') for i in range(3)]
+        latest = {(zones[0].pk, 'A001'): 'occupied', (zones[1].pk, 'A002'): 'occupied'}
+        assert ParkingSpot.objects.filter(_spot_pairs(latest)).count() == 2
+
+        response = driver_client.post('/auth/v1/spots/status/bulk/', [
+            {'zone': 10 ** 20, 'spot_number': 'A001', 'status': 'occupied'},
+            {'zone': zones[2].pk, 'spot_number': 'A001', 'status': ['occupied']},
+            {'zone': zones[2].pk, 'spot_number': 'A003', 'status': 'occupied'},
+        ], format='json')
+        assert response.status_code == 200
+        stats = response.json()['message']
+        assert (stats['updated'], stats['invalid']) == (1, 2)
+
+
+@pytest.mark.django_db
+class TestSensorBuffer:
+    def test_flapping_sensor_is_coalesced(self, make_zone):
+        zone = make_zone(2)
+        buffer = SensorEventBuffer(interval=60, max_size=1000)
+
+        for status in ['occupied', 'empty', 'occupied', 'empty']:
+            buffer.submit([{'zone': zone.pk, 'spot_number': 'A001', 'status': status}])
+        buffer.submit([{'zone': zone.pk, 'spot_number': 'A002', 'status': 'occupied'}])
+        buffer.flush()
+
+        stats = buffer.snapshot()
+        assert (stats['events_in'], stats['writes_out'], stats['coalesced']) == (5, 1, 3)
+        zone.refresh_from_db()
+        assert zone.available_spots == 1
+
+    def test_failing_row_is_dead_lettered(self, make_zone, monkeypatch, caplog):
+        zone = make_zone(3)
+        apply_chunk = ingest._apply_chunk
+
+        def poisoned(latest, stats):
+            if (zone.pk, 'A002') in latest:
+                raise ValueError('bad row')
+            apply_chunk(latest, stats)
+
+        monkeypatch.setattr('user.ingest._apply_chunk', poisoned)
+        buffer = SensorEventBuffer(interval=60, max_size=1000, max_attempts=2)
+        buffer.submit([{'zone': zone.pk, 'spot_number': f'A00{i}', 'status': 'occupied'} for i in range(1, 4)])
+        buffer.flush()
+        assert buffer.snapshot()['pending'] == 1
+        assert zone.parking_spots.filter(status='occupied').count() == 2
+
+        buffer.flush()
+        stats = buffer.snapshot()
+        assert (stats['pending'], stats['dead_lettered'], stats['writes_out']) == (0, 1, 2)
+        assert any(record.name == 'user.ingest.dead_letter' and 'A002' in record.getMessage() for record in caplog.records)
+
+
+class TestAvailabilityPush:
+    def test_hub_fans_out_zone_events(self):
+        hub = Hub()
+        broker = MemoryBroker(hub)
+        changes = [SpotChange(1, 7, 'regular', 'empty', 'occupied'), SpotChange(2, 8, 'vip', 'occupied', 'empty')]
+
+        async def scenario():
+            subscriber = hub.subscribe([7])
+            for event in zone_events(changes):
+                await asyncio.to_thread(broker.publish, event)
+            event = await asyncio.wait_for(subscriber[1].get(), timeout=1)
+            hub.unsubscribe(subscriber, [7])
+            return event, subscriber[1].qsize()
+
+        event, remaining = asyncio.run(scenario())
+        assert event['zone'] == 7 and event['available_delta'] == -1
+        assert remaining == 0
+        assert not hub.has_subscribers()
+
+    def test_overflow_replaces_backlog_with_resync(self):
+        hub = Hub(queue_size=2)
+
+        async def scenario():
+            subscriber = hub.subscribe([7])
+            for event in zone_events([SpotChange(i, 7, 'regular', 'empty', 'occupied') for i in range(3)]) * 3:
+                hub.dispatch(event)
+            await asyncio.sleep(0)
+            queue = subscriber[1]
+            return [queue.get_nowait() for _ in range(queue.qsize())]
+
+        assert asyncio.run(scenario()) == [RESYNC]
+
+
+@pytest.mark.django_db
+class TestChangeFeed:
+    def test_changes_since_cursor(self, driver_client, make_zone):
+        make_zone(3)
+
+        response = driver_client.get('/auth/v1/spots/changes/', {'since': 0, 'limit': 2})
+        data = response.json()['message']
+        assert data['has_more'] is True
+        assert len(data['spots']) == 2
+
+        response = driver_client.get('/auth/v1/spots/changes/', {'since': data['next']})
+        data = response.json()['message']
+        assert [spot['spot_number'] for spot in data['spots']] == ['A003']
+        cursor = data['next']
+
+        change_spot_status(ParkingSpot.objects.get(spot_number='A002'), ParkingSpot.StatusChoices.OCCUPIED)
+        data = driver_client.get('/auth/v1/spots/changes/', {'since': cursor}).json()['message']
+        assert [spot['spot_number'] for spot in data['spots']] == ['A002']
+        assert [zone['available_spots'] for zone in data['zones']] == [2]
+        assert data['has_more'] is False
+
+    @pytest.mark.django_db(transaction=True)
+    def test_save_stamps_version_inside_its_transaction(self, make_zone, monkeypatch):
+        zone = make_zone(1)
+        seen = []
+        stamp = user_models.next_version
+        monkeypatch.setattr('user.models.next_version', lambda: seen.append(connection.in_atomic_block) or stamp())
+        zone.save()
+        zone.parking_spots.get().save()
+        assert seen == [True, True]
+
+    def test_change_versions_are_purged(self, monkeypatch):
+        monkeypatch.setattr('user.models.VERSION_CLEANUP_EVERY', 5)
+        for _ in range(12):
+            user_models.next_version()
+        assert ChangeVersion.objects.count() < 5
+
+    def test_shard_deltas_and_deletes(self, driver_client, make_zone):
+        zone = set_zone_shards(make_zone(2), 4)
+        cursor = driver_client.get('/auth/v1/spots/changes/', {'since': 0}).json()['message']['next']
+
+        # sharded zona qatori o'zgarmaydi, lekin feed uni shard versiyasi orqali qaytaradi
+        adjust_available(zone.pk, -1, zone.shard_count)
+        data = driver_client.get('/auth/v1/spots/changes/', {'since': cursor}).json()['message']
+        assert [item['available_spots'] for item in data['zones']] == [1]
+
+        spot = ParkingSpot.objects.get(spot_number='A001')
+        spot_id = spot.pk
+        spot.delete()
+        data = driver_client.get('/auth/v1/spots/changes/', {'since': data['next']}).json()['message']
+        assert data['deleted'] == {'spots': [spot_id], 'zones': []}
+        assert data['spots'] == []
+
+
+@pytest.mark.django_db
+class TestKeysetPagination:
+    def test_spot_list_pages(self, driver_client, make_zone):
+        make_zone(5)
+
+        numbers, url = [], '/auth/v1/spots/list/?page_size=2'
+        while url:
+            response = driver_client.get(url)
+            numbers += [spot['spot_number'] for spot in response.json()]
+            url = response.headers.get('Link', '').partition('<')[2].partition('>')[0]
+        assert numbers == [f'A{i:03d}' for i in range(1, 6)]
+
+    def test_malformed_cursor_is_not_found(self, driver_client, make_zone):
+        make_zone(2)
+        for values in (5, {'id': 1}, [[1]]):
+            response = driver_client.get('/auth/v1/spots/list/', {'cursor': encode_cursor(values)})
+            assert response.status_code == 404, values
+        # reservations kaliti (-start_time, -id): ro'yxat DateTimeField ga berilsa ham 404
+        assert driver_client.get('/auth/v1/reservations', {'cursor': encode_cursor([[1], 1])}).status_code == 404
+
+    def test_payments_envelope_has_cursor(self, driver_client, driver, make_zone):
+        for spot in make_zone(3).parking_spots.all():
+            reservation = Reservation.objects.create(user_id=driver, spot_id=spot)
+            Payment.objects.create(reservation=reservation, user=driver, transaction_id=str(reservation.pk))
+
+        first = driver_client.get('/auth/v1/payments', {'page_size': 2}).json()
+        assert first['status'] == 200 and len(first['data']) == 2
+        second = driver_client.get('/auth/v1/payments', {'page_size': 2, 'cursor': first['next']}).json()
+        assert len(second['data']) == 1 and second['next'] is None
+        ids = [payment['id'] for payment in first['data'] + second['data']]
+        assert ids == sorted(ids, reverse=True)
+
+    def test_stream_export_keeps_envelope(self, driver_client, driver, make_zone, settings):
+        settings.STREAM_CHUNK_SIZE = 2
+        for spot in make_zone(5).parking_spots.all():
+            Reservation.objects.create(user_id=driver, spot_id=spot)
+
+        response = driver_client.get('/auth/v1/reservations', {'stream': 1})
+        body = json.loads(b''.join(response.streaming_content))
+        assert body['status'] == 200 and len(body['data']) == 5
+
+        response = driver_client.get('/auth/v1/spots/list/', {'stream': 1})
+        assert len(json.loads(b''.join(response.streaming_content))) == 5
+
+
+@pytest.mark.django_db
+class TestCompiledSerializers:
+    def test_matches_model_serializer(self, driver, make_zone):
+        for spot in make_zone(2).parking_spots.all():
+            reservation = Reservation.objects.create(user_id=driver, spot_id=spot)
+            Payment.objects.create(reservation=reservation, user=driver, transaction_id=str(reservation.pk))
+
+        for model, serializer_class in ((ParkingSpot, ParkingSpotSerializer), (Reservation, ReservationSerializer),
+                                        (Payment, PaymentSerializer)):
+            queryset = model.objects.order_by('id')
+            assert compile_serializer(serializer_class) is not None
+            expected = json.loads(json.dumps(serializer_class(queryset, many=True).data))
+            assert json.loads(FastJSONRenderer().render(serialize_rows(queryset, serializer_class))) == expected
+
+
+@pytest.mark.django_db
+class TestQueryBudget:
+    @pytest.fixture(autouse=True)
+    def payments(self, driver, make_zone):
+        for spot in make_zone(5).parking_spots.all():
+            reservation = Reservation.objects.create(user_id=driver, spot_id=spot)
+            Payment.objects.create(reservation=reservation, user=driver, transaction_id=str(reservation.pk))
+
+    def test_list_views_have_constant_queries(self, driver_client):
+        assert_query_budget(2, driver_client.get, '/auth/v1/reservations')
+        assert_query_budget(2, driver_client.get, '/auth/v1/payments')
+        assert_query_budget(2, driver_client.get, '/auth/v1/spots/list/')
+
+    def test_query_plans_cover_relations(self, driver, django_assert_num_queries):
+        with django_assert_num_queries(1):
+            for reservation in ReservationListCreateAPIView.queryset.filter(user_id=driver):
+                str(reservation.spot_id.zone), str(reservation.user_id)
+        with django_assert_num_queries(1):
+            for payment in PaymentListCreateAPIView.queryset.filter(user=driver):
+                str(payment.reservation.spot_id.zone), str(payment.user)
+
+
+@pytest.mark.django_db
+class TestQueryInstrumentation:
+    def test_server_timing_and_repeat_warning(self, rf, settings, caplog, make_zone):
+        settings.QUERY_REPEAT_THRESHOLD = 3
+        spots = list(make_zone(5).parking_spots.all())
+
+        def per_row_view(request):
+            for spot in spots:
+                ParkingSpot.objects.get(pk=spot.pk)
+            return HttpResponse()
+
+        response = QueryInstrumentationMiddleware(per_row_view)(rf.get('/auth/v1/spots/list/'))
+        assert 'desc="5 queries"' in response['Server-Timing']
+        assert any('N+1' in record.getMessage() for record in caplog.records)
+
+    def test_fingerprint_ignores_in_list_length(self):
+        assert fingerprint('SELECT 1 WHERE id IN (%s, %s) LIMIT 21') == fingerprint('SELECT 2 WHERE id IN (%s) LIMIT 5')
+
+
+@pytest.mark.django_db
+class TestMetrics:
+    def test_metrics_aggregate_workers(self, client, settings, tmp_path, monkeypatch):
+        settings.METRICS_DIR = str(tmp_path)
+        registry = Registry()
+        monkeypatch.setattr('user.metrics.registry', registry)
+        monkeypatch.setattr('user.middleware.registry', registry)
+
+        client.get('/auth/v1/spots/list/')
+        # boshqa (to'xtagan) workerning fayli: counter qo'shiladi, in-flight gauge tashlanadi
+        (tmp_path / '999999.json').write_text(json.dumps({
+            'values': [['http_requests_total', [['view', 'spots'], ['method', 'GET'], ['status', '200']], 2],
+                       ['http_requests_in_flight', [['view', 'spots']], 5]],
+            'histograms': [],
+        }))
+
+        body = client.get('/metrics').content.decode()
+        assert 'http_requests_total{view="spots",method="GET",status="200"} 3.0' in body
+        assert 'http_requests_in_flight{view="spots"} 0.0' in body
+        assert 'http_request_duration_seconds_count{view="spots"} 1' in body
+        assert 'db_query_duration_seconds_bucket{view="spots",le="+Inf"} 1' in body
+
+        # to'xtagan workerning fayli retired.json ga ko'chirildi: PID qayta ishlatilsa ham counterlar saqlanadi
+        assert not (tmp_path / '999999.json').exists() and (tmp_path / 'retired.json').exists()
+        registry.inc('http_requests_total', (('view', 'spots'),), 1234567)
+        body = client.get('/metrics').content.decode()
+        assert 'http_requests_total{view="spots",method="GET",status="200"} 3.0' in body
+        assert 'http_requests_total{view="spots"} 1234567.0' in body
+
+    def test_metrics_access_is_restricted(self, client, settings):
+        assert client.get('/metrics', REMOTE_ADDR='203.0.113.7').status_code == 403
+        settings.METRICS_TOKEN = 'scrape-secret'
+        assert client.get('/metrics').status_code == 403
+        assert client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret', REMOTE_ADDR='203.0.113.7').status_code == 200
+
+
+@pytest.mark.django_db
+class TestZoneCache:
+    def test_list_etag_and_invalidation(self, admin_client, make_zone, django_capture_on_commit_callbacks):
+        cache.clear()
+        zone = make_zone(2)
+        spot = zone.parking_spots.get(spot_number='A001')
+
+        first = admin_client.get('/auth/v1/parking-zones')
+        etag = first['ETag']
+        assert first.json()['message'][0]['available_spots'] == 2
+        assert admin_client.get('/auth/v1/parking-zones', HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+        # spot holati o'zgarsa available_spots eskiradi
+        with django_capture_on_commit_callbacks(execute=True):
+            change_spot_status(spot, ParkingSpot.StatusChoices.OCCUPIED)
+        second = admin_client.get('/auth/v1/parking-zones', HTTP_IF_NONE_MATCH=etag)
+        assert second.status_code == 200 and second.json()['message'][0]['available_spots'] == 1
+
+        zone.name = 'Mall 2'
+        zone.save()
+        detail = admin_client.get(f'/auth/v1/parking-zones/detail/{zone.pk}')
+        assert detail.json()['name'] == 'Mall 2'
+        assert admin_client.get(f'/auth/v1/parking-zones/detail/{zone.pk}',
+                              HTTP_IF_NONE_MATCH=detail['ETag']).status_code == 304
+
+
+class TestSingleFlight:
+    def test_concurrent_misses_compute_once(self):
+        flight, calls, results = SingleFlight(), [], []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return 'fresh'
+
+        threads = [threading.Thread(target=lambda: results.append(flight.do('zone:1', compute))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(calls) == 1 and results == ['fresh'] * 8
+
+    def test_stale_value_served_while_revalidating(self):
+        flight, started = SingleFlight(), threading.Event()
+
+        def compute():
+            started.set()
+            time.sleep(0.1)
+            return 'fresh'
+
+        leader = threading.Thread(target=flight.do, args=('zone:1', compute))
+        leader.start()
+        started.wait()
+        assert flight.do('zone:1', compute, stale='stale') == 'stale'
+        leader.join()
+
+
+@pytest.mark.django_db
+class TestCachedAuthentication:
+    @pytest.fixture
+    def user(self, driver):
+        cache.clear()
+        local_users.users.clear()
+        return driver
+
+    def _client(self, user):
+        client = APIClient()
+        token = CustomTokenObtainPairSerializer.get_token(user).access_token
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return client
+
+    def _user_queries(self, client, url):
+        with CaptureQueriesContext(connection) as queries:
+            assert client.get(url).status_code == 200
+        return [query for query in queries if 'user_user' in query['sql'] and 'reservation' not in query['sql']]
+
+    def test_user_is_cached_and_invalidated(self, user):
+        client = self._client(user)
+        assert len(self._user_queries(client, '/auth/v1/reservations')) == 1
+        assert self._user_queries(client, '/auth/v1/reservations') == []
+
+        user.is_active = False
+        user.save()
+        assert client.get('/auth/v1/reservations').status_code == 401
+
+    def test_trusted_role_claim_skips_user_lookup(self, user, settings):
+        settings.JWT_TRUST_ROLE_CLAIM = True
+        assert self._user_queries(self._client(user), '/auth/v1/reservations') == []
+
+    def test_claims_user_loads_row_once(self, user):
+        claimed = claims_user(user.pk, user.role)
+        with CaptureQueriesContext(connection) as queries:
+            assert (claimed.username, claimed.email, claimed.is_active) == (user.username, user.email, user.is_active)
+        assert len(queries) == 1
+
+
+@pytest.mark.django_db
+class TestTokenRevocation:
+    def test_bloom_filter(self):
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add(f'jti-{i}')
+        assert all(f'jti-{i}' in bloom for i in range(1000))
+        assert sum(f'other-{i}' in bloom for i in range(10000)) < 300
+
+    def test_logout_revokes_access_and_refresh(self, driver):
+        cache.clear()
+        revocations.bloom = None
+        refresh = CustomTokenObtainPairSerializer.get_token(driver)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+        assert client.get('/auth/v1/reservations').status_code == 200
+        assert client.post('/auth/v1/logout', {'refresh': str(refresh)}, format='json').status_code == 200
+        assert client.get('/auth/v1/reservations').status_code == 401
+        assert APIClient().post('/auth/v1/token-refresh', {'refresh': str(refresh)}, format='json').status_code == 401
+
+        # boshqa worker: filter DB dan quriladi, kesh bo'sh
+        cache.clear()
+        revocations.bloom = None
+        assert client.get('/auth/v1/reservations').status_code == 401
+
+    def test_refresh_rereads_late_committed_ids(self):
+        expires_at = timezone.now() + timedelta(hours=1)
+        revocation_list = RevocationList()
+        revocation_list.rebuild()
+        RevokedToken.objects.create(id=10, jti='early', expires_at=expires_at)
+        revocation_list.refresh()
+        # 7-id li qator 10 dan keyin commit bo'ldi
+        RevokedToken.objects.create(id=7, jti='late', expires_at=expires_at)
+        revocation_list.refresh()
+        assert 'early' in revocation_list.bloom and 'late' in revocation_list.bloom
+
+
+@pytest.mark.django_db
+class TestOTPFlow:
+    def test_forgot_verify_change_password(self, driver, settings, mailoutbox):
+        settings.OTP_BACKEND = 'memory'
+        client = APIClient()
+
+        assert client.post('/auth/v1/forgot-password', {'email': 'driver@example.com'}, format='json').json()['status'] == 200
+        get_mail_queue().flush()
+        code = mailoutbox[-1].body
+        change = {'email': 'driver@example.com', 'password': 'new-pass', 'confirm_password': 'new-pass'}
+        assert client.post('/auth/v1/change-password', change, format='json').json()['status'] == 400
+
+        assert client.post('/auth/v1/verify-otp', {'email': 'driver@example.com', 'code': '1'}, format='json').json()['status'] == 400
+        assert client.post('/auth/v1/verify-otp', {'email': 'driver@example.com', 'code': code}, format='json').json()['status'] == 202
+        assert client.post('/auth/v1/change-password', change, format='json').json()['status'] == 202
+        assert User.objects.get(username='driver').check_password('new-pass')
+
+
+class TestMailQueue:
+    def test_retries_over_one_connection(self, settings, monkeypatch):
+        sent, opened = [], []
+
+        class FlakyBackend:
+            failures = 1
+
+            def open(self):
+                opened.append(self)
+
+            def close(self):
+                pass
+
+            def send_messages(self, messages):
+                if FlakyBackend.failures:
+                    FlakyBackend.failures -= 1
+                    raise OSError('connection reset')
+                sent.extend(messages)
+                return len(messages)
+
+        monkeypatch.setattr('user.mailer.get_connection', lambda **kwargs: FlakyBackend())
+        mail_queue = MailQueue(batch_size=10, idle_timeout=1, max_attempts=3, backoff=0)
+        for i in range(5):
+            mail_queue.enqueue(EmailMessage('code', str(i), 'noreply@example.com', [f'user{i}@example.com']))
+        mail_queue.flush()
+
+        # backoff paytida lock bo'sh: flush() keyingi xatlarni yuborib ulgurishi mumkin
+        assert sorted(message.body for message in sent) == ['0', '1', '2', '3', '4']
+        # birinchi xato ulanishdan keyin bitta yangi sessiya barcha xatlar uchun
+        assert len(opened) == 2
+        assert mail_queue.snapshot()['retried'] == 1
+
+    def test_full_queue_rejects(self, settings):
+        mail_queue = MailQueue(batch_size=10, idle_timeout=1, max_attempts=1, backoff=0, max_size=1)
+        mail_queue.thread = threading.current_thread()  # fon threadi ishga tushmasin, navbat bo'shatilmaydi
+        mail_queue.enqueue(EmailMessage('code', '1', 'noreply@example.com', ['a@example.com']))
+        with pytest.raises(MailQueueFull):
+            mail_queue.enqueue(EmailMessage('code', '2', 'noreply@example.com', ['b@example.com']))
+        assert mail_queue.snapshot()['rejected'] == 1
+
+    @pytest.mark.django_db
+    def test_sync_failure_is_reported(self, driver, settings, monkeypatch):
+        settings.MAIL_QUEUE_ASYNC = False
+        settings.OTP_BACKEND = 'memory'
+        monkeypatch.setattr('user.throttling._buckets', {})
+
+        class DownBackend:
+            def open(self):
+                raise OSError('connection refused')
+
+            def close(self):
+                pass
+
+        monkeypatch.setattr('user.mailer.get_connection', lambda **kwargs: DownBackend())
+        monkeypatch.setattr(get_mail_queue(), 'connection', None)
+        response = APIClient().post('/auth/v1/forgot-password', {'email': driver.email}, format='json')
+        assert response.json()['status'] == 503
+
+
+@pytest.mark.django_db
+class TestThrottling:
+    def test_login_bucket_rejects_before_password_check(self, driver, settings, monkeypatch):
+        settings.REST_FRAMEWORK = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'login': '2/min'}}
+        monkeypatch.setattr('user.throttling._buckets', {})
+        checks = []
+        monkeypatch.setattr(User, 'check_password', lambda user, raw: checks.append(raw) or False)
+        client = APIClient()
+
+        for _ in range(2):
+            assert client.post('/auth/v1/login', {'username': 'driver', 'password': 'x'}, format='json').status_code == 401
+        response = client.post('/auth/v1/login', {'username': 'driver', 'password': 'x'}, format='json')
+        assert response.status_code == 429 and int(response['Retry-After']) > 0
+        assert len(checks) == 2
+
+    def test_rejected_request_leaves_other_buckets(self, settings, monkeypatch):
+        settings.REST_FRAMEWORK = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'login': '1/min'}}
+        monkeypatch.setattr('user.throttling._buckets', {})
+        client = APIClient()
+        client.post('/auth/v1/login', {'username': 'first', 'password': 'x'}, format='json')
+        # IP bucket bo'sh: 'second' bucketidan token olinmaydi
+        assert client.post('/auth/v1/login', {'username': 'second', 'password': 'x'}, format='json').status_code == 429
+        assert get_token_bucket().take('throttle:login:username:second', 1, 1 / 60)[0]
+
+
+@pytest.mark.django_db
+class TestPasswordHashing:
+    def test_register_hashes_once_and_can_login(self, monkeypatch):
+        monkeypatch.setattr('user.throttling._buckets', {})
+        client = APIClient()
+        response = client.post('/auth/v1/register', {'username': 'driver', 'email': 'driver@example.com', 'password': 'secret-1',
+                                                     'phone': '998901112233', 'first_name': 'Ali'}, format='json')
+        assert response.status_code == 201 and 'password' not in response.json()
+        assert User.objects.get(username='driver').check_password('secret-1')
+        assert 'access' in client.post('/auth/v1/login', {'username': 'driver', 'password': 'secret-1'}, format='json').json()
+
+    def test_executor_fails_fast_when_full(self):
+        executor, release = HashingExecutor(workers=1, max_pending=1, timeout=5), threading.Event()
+        threads = [threading.Thread(target=executor.run, args=(release.wait,)) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        with pytest.raises(HashingBusy):
+            executor.run(lambda: None)
+        release.set()
+        for thread in threads:
+            thread.join()
+        assert executor.run(lambda: 'ok') == 'ok'
+
+    def test_shared_limit_spans_processes(self):
+        executor = HashingExecutor(workers=1, max_pending=1, timeout=5, shared_limit=2)
+        # boshqa workerlar ikkala umumiy slotni band qilgan
+        cache.set(SharedSlots.key, 2)
+        with pytest.raises(HashingBusy):
+            executor.run(lambda: None)
+        cache.decr(SharedSlots.key)
+        assert executor.run(lambda: 'ok') == 'ok'
+        assert cache.get(SharedSlots.key) == 1
+
+    def test_login_checks_password_in_pool(self, driver, monkeypatch):
+        monkeypatch.setattr('user.throttling._buckets', {})
+        User.objects.filter(pk=driver.pk).update(password=make_password('secret-1'))
+        calls = []
+        run = HashingExecutor.run
+        monkeypatch.setattr(HashingExecutor, 'run', lambda executor, func, *args: calls.append(func) or run(executor, func, *args))
+        response = APIClient().post('/auth/v1/login', {'username': 'driver', 'password': 'secret-1'}, format='json')
+        assert 'access' in response.json()
+        assert [func.__name__ for func in calls] == ['verify_password']
+
+    def test_executor_timeout_is_busy(self):
+        executor, release = HashingExecutor(workers=1, max_pending=1, timeout=0.05), threading.Event()
+        with pytest.raises(HashingBusy):
+            executor.run(release.wait)
+        release.set()
+
+
+@pytest.mark.django_db
+class TestUserImport:
+    def test_register_checks_uniqueness_in_one_query(self, monkeypatch):
+        monkeypatch.setattr('user.throttling._buckets', {})
+        User.objects.create(username='taken', email='taken@example.com', phone='998900000000')
+        data = {'username': 'taken', 'email': 'taken@example.com', 'password': 'x', 'phone': '998900000000'}
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().post('/auth/v1/register', data, format='json')
+        assert response.status_code == 400
+        assert set(response.json()) == {'username', 'email', 'phone'}
+        assert len([query for query in queries if 'user_user' in query['sql']]) == 1
+
+    def test_csv_import_skips_duplicates(self, admin_client):
+        User.objects.create(username='old', email='old@example.com', phone='998900000000')
+        body = ("username,email,phone,first_name\n"
+                "d1,d1@example.com,998901000001,A\n"
+                "d2,d2@example.com,998901000002,B\n"
+                "old,x@example.com,998901000003,C\n"
+                "d4,d4@example.com,998901000001,D\n"
+                "d5,bad-email,998901000005,E\n")
+        response = admin_client.post('/auth/v1/profile/import', body, content_type='text/csv')
+        stats = response.json()['message']
+        assert (stats['created'], stats['duplicate'], stats['invalid']) == (2, 2, 1)
+        assert stats['errors'][0]['row'] == 5
+        assert not User.objects.get(username='d1').has_usable_password()
+
+    def test_command_imports_ndjson_in_chunks(self, tmp_path):
+        path = tmp_path / 'users.ndjson'
+        path.write_text(''.join(json.dumps({'username': f'u{i}', 'email': f'u{i}@example.com', 'phone': f'99890{i:07d}'}) + '\n'
+                                for i in range(25)))
+        call_command('import_users', str(path), chunk_size=10)
+        assert User.objects.filter(username__startswith='u').count() == 25
+
+
+@pytest.mark.django_db
+class TestUserSearch:
+    @pytest.fixture(autouse=True)
+    def fresh_index(self, monkeypatch):
+        monkeypatch.setattr('user.search._index', None)
+
+    def test_prefix_over_username_email_and_phone(self, admin_client):
+        User.objects.create(username='Alisher', email='a.k@example.com', phone='998901234567')
+        User.objects.create(username='botir', email='alimov@mail.uz', phone='998935550000')
+        User.objects.create(username='kamol', email='kamol@example.com', phone='998977770000')
+
+        def usernames(q, **params):
+            response = admin_client.get('/auth/v1/profile/search', {'q': q, **params})
+            return [user['username'] for user in response.json()['message']]
+
+        assert usernames('ali') == ['botir', 'Alisher']
+        assert usernames('+998 93') == ['botir']
+        assert usernames('ali', limit=1) == ['botir']
+        # indeks qurilgandan keyin yaratilgan foydalanuvchi ham topiladi, o'zgargan username eski kalit bilan chiqmaydi
+        User.objects.create(username='alijon', email='alijon@example.com', phone='998990000000')
+        kamol = User.objects.get(username='kamol')
+        kamol.username = 'kamoliddin'
+        kamol.save()
+        assert usernames('ali') == ['alijon', 'botir', 'Alisher']
+        assert usernames('kamol') == ['kamoliddin']
+
+    def test_resave_replaces_keys(self, driver):
+        index = PrefixIndex([(driver.pk, driver.username, driver.email, driver.phone)])
+        size = len(index.keys)
+        index.add(driver)
+        driver.username = 'driver2'
+        index.add(driver)
+        assert len(index.keys) == size
+        assert index.search('driver', '', 10) == [driver.pk] and 'driver' not in index.keys
+
+    def test_requires_admin(self, driver_client):
+        assert driver_client.get('/auth/v1/profile/search', {'q': 'a'}).status_code == 403
@@ -0,0 +1,127 @@
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from user.redis_client import get_redis
+
+# bucket holati (tokens, ts) Redis hashida; to'ldirish va olish bitta atomar skriptda
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(now - ts, 0) * rate)
+local allowed, wait = 0, 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return {allowed, tostring(wait)}
+"""
+
+
+class RedisTokenBucket:
+    def __init__(self):
+        self.take_script = get_redis().register_script(TAKE_SCRIPT)
+
+    def take(self, key, capacity, rate):
+        allowed, wait = self.take_script(keys=[key], args=[capacity, rate])
+        return bool(allowed), float(wait)
+
+
+class MemoryTokenBucket:
+    # bitta node yoki testlar uchun; har bir worker o'z bucketlarini saqlaydi
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def take(self, key, capacity, rate):
+        now = time.monotonic()
+        with self.lock:
+            tokens, ts = self.buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - ts) * rate)
+            if tokens >= 1:
+                self.buckets[key] = (tokens - 1, now)
+                return True, 0.0
+            self.buckets[key] = (tokens, now)
+            return False, (1 - tokens) / rate
+
+
+_buckets = {}
+
+
+def get_token_bucket():
+    backend = getattr(settings, 'THROTTLE_BACKEND', 'redis')
+    if backend not in _buckets:
+        _buckets[backend] = RedisTokenBucket() if backend == 'redis' else MemoryTokenBucket()
+    return _buckets[backend]
+
+
+def parse_rate(rate):
+    # DRF formati: '10/min' -> (sig'im 10, sekundiga 10/60 token)
+    count, period = rate.split('/')
+    seconds = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+    return int(count), int(count) / seconds
+
+
+class TokenBucketThrottle(BaseThrottle):
+    # IP va so'rovdagi username/email bo'yicha alohida bucketlar; bittasi bo'sh bo'lsa ham 429
+    scope = None
+    identity_fields = ()
+
+    def get_keys(self, request):
+        keys = [f'throttle:{self.scope}:ip:{self.get_ident(request)}']
+        data = request.data if hasattr(request.data, 'get') else {}
+        for field in self.identity_fields:
+            value = data.get(field)
+            if isinstance(value, str) and value.strip():
+                keys.append(f'throttle:{self.scope}:{field}:{value.strip().lower()}')
+        return keys
+
+    def allow_request(self, request, view):
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        if rate is None:
+            return True
+        capacity, refill = parse_rate(rate)
+        self.retry_after = 0.0
+        bucket = get_token_bucket()
+        for key in self.get_keys(request):
+            allowed, wait = bucket.take(key, capacity, refill)
+            if not allowed:
+                # rad etilgan so'rov qolgan bucketlardan token olmaydi
+                self.retry_after = wait
+                return False
+        return True
+
+    def wait(self):
+        return self.retry_after
+
+
+class LoginThrottle(TokenBucketThrottle):
+    scope = 'login'
+    identity_fields = ('username',)
+
+
+class RegisterThrottle(TokenBucketThrottle):
+    scope = 'register'
+    identity_fields = ('email', 'username')
+
+
+class OTPSendThrottle(TokenBucketThrottle):
+    scope = 'otp-send'
+    identity_fields = ('email',)
+
+
+class OTPVerifyThrottle(TokenBucketThrottle):
+    scope = 'otp-verify'
+    identity_fields = ('email',)
@@ -3,12 +3,15 @@ from django.urls import path
 
 from user.models import Reservation
 from user.views import (RegisterCreateAPIView, ForgotAPIView, CustomTokenObtainPairView, CustomTokenRefreshView,
-                        VerifyOTPAPIView, ChangePasswordAPIView, ProfileAPIView, ProfileUpdateAPIView,
-                        ProfileListAPIView, ProfileDeleteAPIView, ParkingZoneListAPIView,
-                        ParkingZoneDetailAPIView, ParkingZoneSpotsAPIView, SpotListAPIView, SpotAvailableAPIView,
-                        SpotCreateAPIView, SpotUpdateAPIView, SpotStatusAPIView, ReservationListCreateAPIView,
+                        LogoutAPIView, VerifyOTPAPIView, ChangePasswordAPIView, ProfileAPIView, ProfileUpdateAPIView,
+                        ProfileListAPIView, ProfileDeleteAPIView, ParkingZoneListAPIView, ParkingZoneDetailAPIView,
+                        ParkingZoneNearbyAPIView, ParkingZoneSpotsAPIView, SpotListAPIView, SpotAvailableAPIView,
+                        SpotAvailableCountAPIView, SpotCreateAPIView, SpotAllocateAPIView, SpotUpdateAPIView,
+                        SpotStatusAPIView, SpotStatusBulkAPIView, SpotStatusBulkStatsAPIView,
+                        SpotAvailabilityStreamView, SpotChangesAPIView, ReservationListCreateAPIView,
                         ReservationDetailAPIView, ReservationCheckInAPIView, ReservationCheckOutAPIView,
-                        PaymentListCreateAPIView, PaymentDetailAPIView, PaymentRefundAPIView)
+                        PaymentListCreateAPIView, PaymentDetailAPIView, PaymentRefundAPIView, ProfileImportAPIView,
+                        ProfileSearchAPIView)
 
 
 
@@ -17,6 +20,7 @@ urlpatterns = [
     path('register', RegisterCreateAPIView.as_view(), name="register"),
     path('login', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token-refresh', CustomTokenRefreshView.as_view(), name='token_refresh'),
+    path('logout', LogoutAPIView.as_view(), name='logout'),
     path('forgot-password', ForgotAPIView.as_view(), name="forgot-password"),
     path('verify-otp', VerifyOTPAPIView.as_view(), name="verify_otp"),
     path('change-password', ChangePasswordAPIView.as_view(), name="change_password"),
@@ -31,6 +35,8 @@ urlpatterns += [
     path('profile/about', ProfileAPIView.as_view(), name="profile-about"),
     path('profile/update', ProfileUpdateAPIView.as_view(), name="profile-update"),
     path('profile/list', ProfileListAPIView.as_view(), name="profile-list"),
+    path('profile/import', ProfileImportAPIView.as_view(), name="profile-import"),
+    path('profile/search', ProfileSearchAPIView.as_view(), name="profile-search"),
      path('profile/<int:pk>', ProfileDeleteAPIView.as_view(), name="profile-delete"),
 ]
 
@@ -39,6 +45,7 @@ urlpatterns += [
 
 urlpatterns += [
     path('parking-zones', ParkingZoneListAPIView.as_view(), name="parking-zone-list"),
+    path('parking-zones/nearby', ParkingZoneNearbyAPIView.as_view(), name="parking-zone-nearby"),
     path('parking-zones/detail/<int:pk>', ParkingZoneDetailAPIView.as_view(), name="parking-zone-update"),
     path('parking-zones-spots/<int:pk>/spots', ParkingZoneSpotsAPIView.as_view(), name="parking-zone-spots"),
 ]
@@ -49,9 +56,15 @@ urlpatterns += [
 urlpatterns += [
     path('spots/list/', SpotListAPIView.as_view(), name="spots"),
     path('spots/available/', SpotAvailableAPIView.as_view(), name="spots-available"),
+    path('spots/available/<int:pk>/count/', SpotAvailableCountAPIView.as_view(), name="spots-available-count"),
     path('spots/', SpotCreateAPIView.as_view(), name="spots-create"),
+    path('spots/allocate', SpotAllocateAPIView.as_view(), name="spots-allocate"),
     path('spots/<int:pk>/', SpotUpdateAPIView.as_view(), name="spots-update"),
     path('spots/<int:pk>/status/', SpotStatusAPIView.as_view(), name='spots-status'),
+    path('spots/status/bulk/', SpotStatusBulkAPIView.as_view(), name='spots-status-bulk'),
+    path('spots/changes/', SpotChangesAPIView.as_view(), name='spots-changes'),
+    path('spots/stream/', SpotAvailabilityStreamView.as_view(), name='spots-stream'),
+    path('spots/status/bulk/stats/', SpotStatusBulkStatsAPIView.as_view(), name='spots-status-bulk-stats'),
 ]
 
 
@@ -1,25 +1,59 @@
+import asyncio
+import hmac
+import json
 from decimal import Decimal
 from http import HTTPStatus
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.db import transaction
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse, HttpResponse
+from django.views import View
 from drf_spectacular.utils import extend_schema
 from rest_framework import status
 from rest_framework.decorators import permission_classes
 from rest_framework.generics import CreateAPIView, UpdateAPIView, ListAPIView, DestroyAPIView, \
     RetrieveUpdateDestroyAPIView, get_object_or_404, ListCreateAPIView
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
-from user.models import User, ParkingZone, ParkingSpot, Reservation, Payment
+from user.allocation import allocate_spot, NoSpotAvailable
+from user.authentication import CachedJWTAuthentication
+from user.availability import get_availability
+from user.caching import cached_json, etag_response
+from user.changefeed import changes_since
+from user.counters import change_spot_status, relocate_spot, with_live_counters, spots_created, adjust_available, \
+    status_delta, reconcile_zone_counters
+from user.fastpath import CompiledListMixin
+from user import metrics
+from user.ingest import apply_status_events, get_sensor_buffer
+from user.models import User, ParkingZone, ParkingSpot, Reservation, Payment, next_version
+from user.pagination import KeysetPagination
+from user.importing import import_users
+from user.parsers import NDJSONParser, CSVParser
 from user.permissions import IsAdmin
+from user.push import hub, get_broker, RESYNC
+from user.revocation import revoke_token
+from user.renderers import FastJSONRenderer
 from user.serializers import RegisterModelSerializer, ForgotSerializer, VerifyOTPSerializer, \
     ChangePasswordSerializer, ProfileModelSerializer, ParkingZoneModelSerializer, ParkingZoneDetailSerializer, \
-    ParkingSpotSerializer, ReservationSerializer, PaymentSerializer
+    ParkingSpotSerializer, ReservationSerializer, PaymentSerializer, ParkingZoneNearbyQuerySerializer, \
+    ParkingZoneNearbySerializer, SpotAllocateSerializer, ParkingSpotChangeSerializer, ParkingZoneChangeSerializer, \
+    ChangeFeedQuerySerializer, CustomTokenObtainPairSerializer, CustomTokenRefreshSerializer, LogoutSerializer, \
+    ProfileSearchQuerySerializer
+from user.search import search_users
+from user.spatial import get_index
+from user.streaming import stream_json_list, wants_stream
+from user.throttling import LoginThrottle, RegisterThrottle, OTPSendThrottle, OTPVerifyThrottle
 
 
 # Create your views here.
@@ -29,28 +63,57 @@ class RegisterCreateAPIView(CreateAPIView):
     queryset = User.objects.all()
     serializer_class = RegisterModelSerializer
     permission_classes = [AllowAny]
+    throttle_classes = [RegisterThrottle]
 
 @extend_schema(tags=['auth'])
 class CustomTokenObtainPairView(TokenObtainPairView):
-    pass
+    serializer_class = CustomTokenObtainPairSerializer
+    # parol hash tekshiruvidan oldin rad etiladi
+    throttle_classes = [LoginThrottle]
 
 @extend_schema(tags=['auth'])
 class CustomTokenRefreshView(TokenRefreshView):
-    pass
+    serializer_class = CustomTokenRefreshSerializer
+
+
+@extend_schema(tags=['auth'], request=LogoutSerializer)
+class LogoutAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = LogoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # joriy access token va (berilsa) refresh token jti bo'yicha bekor qilinadi
+        revoke_token(request.auth, request.user)
+        refresh = serializer.validated_data.get('refresh')
+        if refresh:
+            try:
+                revoke_token(RefreshToken(refresh), request.user)
+            except TokenError as exc:
+                return Response({'status': HTTPStatus.BAD_REQUEST, 'message': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'status': HTTPStatus.OK, 'message': "Tizimdan chiqildi."})
 
 @extend_schema(tags=['auth'], request=ForgotSerializer)
 class ForgotAPIView(APIView):
+    throttle_classes = [OTPSendThrottle]
+
     def post(self, request, *args, **kwargs):
         data = request.data
         serializer = ForgotSerializer(data=data)
         if serializer.is_valid():
-            serializer.send_code(data['email'])
+            try:
+                serializer.send_code(data['email'])
+            except OSError:
+                # MAIL_QUEUE_ASYNC=False: SMTP xatosi (smtplib.SMTPException ham OSError)
+                return JsonResponse({'status': HTTPStatus.SERVICE_UNAVAILABLE, 'message': "Tasdiqlash kodini yuborib bo'lmadi!"})
             return JsonResponse({'status': HTTPStatus.OK, 'message': "Tasdiqlash kodi yuborildi!"})
         return JsonResponse({"status": HTTPStatus.BAD_REQUEST, "message": "Bunday email topilmadi!"})
 
 
 @extend_schema(tags=['auth'], request=VerifyOTPSerializer)
 class VerifyOTPAPIView(APIView):
+    throttle_classes = [OTPVerifyThrottle]
+
     def post(self, request, *args, **kwargs):
         data = request.data
         serializer = VerifyOTPSerializer(data=data)
@@ -96,6 +159,22 @@ class ProfileListAPIView(ListAPIView):
     queryset = User.objects.all()
     serializer_class = ProfileModelSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    ordering = ('id',)
+
+@extend_schema(tags=['profile'], parameters=[ProfileSearchQuerySerializer],
+               responses=ProfileModelSerializer(many=True))
+class ProfileSearchAPIView(APIView):
+    # username, email yoki telefon boshlanishi bo'yicha: ?q=ali, ?q=+998 90
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    def get(self, request, *args, **kwargs):
+        query = ProfileSearchQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return JsonResponse({'status': HTTPStatus.BAD_REQUEST, 'message': query.errors}, status=HTTPStatus.BAD_REQUEST)
+        users = search_users(query.validated_data['q'], query.validated_data['limit'])
+        return JsonResponse({'status': HTTPStatus.OK, 'message': ProfileModelSerializer(users, many=True).data})
+
 
 @extend_schema(tags=['profile'], request=ProfileModelSerializer)
 class ProfileDeleteAPIView(DestroyAPIView):
@@ -110,14 +189,31 @@ class ProfileDeleteAPIView(DestroyAPIView):
         return JsonResponse({'status': HTTPStatus.OK, 'message': "Muvaffaqiyatli o'chirildi!"})
 
 
+@extend_schema(tags=['profile'])
+class ProfileImportAPIView(APIView):
+    # korporativ mijozlar haydovchilarini CSV/NDJSON dan chunk lab import qilish; katta fayllar uchun import_users command
+    permission_classes = [IsAuthenticated, IsAdmin]
+    parser_classes = [JSONParser, NDJSONParser, CSVParser]
+
+    def post(self, request, *args, **kwargs):
+        rows = request.data
+        if not isinstance(rows, list):
+            return JsonResponse({'status': HTTPStatus.BAD_REQUEST, 'message': "Foydalanuvchilar ro'yxati kutilgan!"},
+                                status=HTTPStatus.BAD_REQUEST)
+        return JsonResponse({'status': HTTPStatus.OK, 'message': import_users(rows)})
+
+
 # ======================== Parking zones========================
 
 @extend_schema(tags=['parking-zone'])
-class ParkingZoneListAPIView(CreateAPIView):
+class ParkingZoneListAPIView(ListCreateAPIView):
     queryset = ParkingZone.objects.all()
     serializer_class = ParkingZoneModelSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_queryset(self):
+        return with_live_counters(super().get_queryset())
+
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return ParkingZoneDetailSerializer
@@ -129,12 +225,15 @@ class ParkingZoneListAPIView(CreateAPIView):
         return [IsAuthenticated()]
 
     def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(queryset, many=True)
-        return Response({'status': HTTPStatus.OK, 'message': serializer.data})
+        def build():
+            serializer = self.get_serializer(self.filter_queryset(self.get_queryset()), many=True)
+            return {'status': HTTPStatus.OK, 'message': serializer.data}
+
+        return etag_response(request, *cached_json('zones', 'zones:list', build))
 
     def create_parking_spots(self, zone):
         spots = []
+        version = next_version()
         for i in range(1, zone.total_spots + 1):
             spot_type = 'regular'
             if i <= 2:
@@ -145,26 +244,75 @@ class ParkingZoneListAPIView(CreateAPIView):
             spots.append(ParkingSpot(
                 zone=zone,
                 spot_type=spot_type,
-                spot_number=f'A{i:03d}'
+                spot_number=f'A{i:03d}',
+                version=version,
             ))
-        ParkingSpot.objects.bulk_create(spots)
+        spots_created(ParkingSpot.objects.bulk_create(spots))
 
     def create(self, request, *args, **kwargs):
         data = request.data
         serializer = self.get_serializer(data=data)
         serializer.is_valid(raise_exception=True)
-        self.perform_create(serializer)
-        zone = serializer.instance
-        self.create_parking_spots(zone)
+        with transaction.atomic():
+            # yangi zonaning barcha joylari 'empty' bo'lib yaratiladi
+            zone = serializer.save(available_spots=serializer.validated_data['total_spots'])
+            self.create_parking_spots(zone)
         return Response({'status': HTTPStatus.CREATED, 'message': "Parking Zone muvaffaqiyatli yaratildi!"})
 
 
+@extend_schema(tags=['parking-zone'], parameters=[ParkingZoneNearbyQuerySerializer],
+               responses=ParkingZoneNearbySerializer(many=True))
+class ParkingZoneNearbyAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        query = ParkingZoneNearbyQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return JsonResponse({'status': HTTPStatus.BAD_REQUEST, 'message': query.errors}, status=HTTPStatus.BAD_REQUEST)
+        lat, lon = query.validated_data['lat'], query.validated_data['lon']
+        limit = query.validated_data['limit']
+
+        candidates = get_index().nearby(lat, lon, query.validated_data['radius'])
+        # faqat bo'sh joyi bor zonalar, eng yaqinidan boshlab: nomzodlar masofa tartibida kichik partiyalarda
+        # o'qiladi va limit ta zona topilishi bilan to'xtatiladi
+        zones, batch_size = [], limit * 2
+        for start in range(0, len(candidates), batch_size):
+            batch = candidates[start:start + batch_size]
+            loaded = with_live_counters(ParkingZone.objects.all()).in_bulk([zone_id for _, zone_id in batch])
+            for distance, zone_id in batch:
+                zone = loaded.get(zone_id)
+                if zone is not None and zone.live_available_spots > 0:
+                    zone.distance = round(distance, 3)
+                    zones.append(zone)
+            if len(zones) >= limit:
+                break
+        serializer = ParkingZoneNearbySerializer(zones[:limit], many=True)
+        return JsonResponse({'status': HTTPStatus.OK, 'message': serializer.data})
+
+
 @extend_schema(tags=['parking-zone'], request=ParkingZoneModelSerializer)
 class ParkingZoneDetailAPIView(RetrieveUpdateDestroyAPIView):
     queryset = ParkingZone.objects.all()
     serializer_class = ParkingZoneModelSerializer
     permission_classes = [IsAuthenticated, IsAdmin]
 
+    def get_queryset(self):
+        return with_live_counters(super().get_queryset())
+
+    def retrieve(self, request, *args, **kwargs):
+        build = lambda: self.get_serializer(self.get_object()).data
+        return etag_response(request, *cached_json('zones', f"zones:detail:{kwargs['pk']}", build))
+
+    def perform_update(self, serializer):
+        total_spots = serializer.instance.total_spots
+        with transaction.atomic():
+            zone = serializer.save()
+            if zone.total_spots != total_spots:
+                # total_spots o'zgarsa available counter va shardlar joylardan qayta hisoblanadi
+                reconcile_zone_counters([zone.pk])
+                zone.refresh_from_db(fields=['available_spots'])
+                zone.pending_available = 0
+
     def available_spots(self, request, pk=None):
         zone = self.get_object()
         available_spots = zone.spots.filter(status='available', is_active=True)
@@ -190,19 +338,54 @@ class ParkingZoneSpotsAPIView(APIView):
 #========================= Parking Spots ====================================
 
 @extend_schema(tags=['spots'], request=ParkingSpotSerializer)
-class SpotListAPIView(ListAPIView):
+class SpotListAPIView(CompiledListMixin, ListAPIView):
     serializer_class = ParkingSpotSerializer
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    pagination_class = KeysetPagination
+    ordering = ('zone_id', 'id')
 
     def get_queryset(self):
         return ParkingSpot.objects.all()
 
+    def list(self, request, *args, **kwargs):
+        if wants_stream(request):
+            return stream_json_list(self.get_queryset().order_by(*self.ordering), ParkingSpotSerializer)
+        return super().list(request, *args, **kwargs)
+
 @extend_schema(tags=['spots'], request=ParkingSpotSerializer)
-class SpotAvailableAPIView(ListAPIView):
+class SpotAvailableAPIView(CompiledListMixin, ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = ParkingSpotSerializer
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    # bundan ko'p id bo'lsa IN (...) o'rniga oddiy status filtri ishlatiladi
+    max_in_ids = 5000
 
     def get_queryset(self):
-        return ParkingSpot.objects.filter(status='empty') # is_active=True
+        zone_id = self.request.query_params.get('zone')
+        zone_id = int(zone_id) if zone_id and zone_id.isdigit() else None
+        spot_type = self.request.query_params.get('spot_type') or None
+
+        ids = get_availability().ids(zone_id, spot_type)
+        if len(ids) <= self.max_in_ids:
+            # bitmap faqat nomzodlarni beradi, holat DB dan tekshiriladi (bitmap boshqa workerda eskirgan bo'lishi mumkin)
+            return ParkingSpot.objects.filter(pk__in=ids, status='empty').order_by('zone_id', 'spot_number')
+        queryset = ParkingSpot.objects.filter(status='empty') # is_active=True
+        if zone_id is not None:
+            queryset = queryset.filter(zone_id=zone_id)
+        if spot_type:
+            queryset = queryset.filter(spot_type=spot_type)
+        return queryset.order_by('zone_id', 'spot_number')
+
+
+@extend_schema(tags=['spots'])
+class SpotAvailableCountAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk, *args, **kwargs):
+        counts = get_availability().counts(pk)
+        return JsonResponse({'status': HTTPStatus.OK, 'message': {
+            'zone': pk, 'total': sum(counts.values()), 'by_type': counts,
+        }})
 
 
 @extend_schema(tags=['spots'], request=ParkingSpotSerializer)
@@ -214,6 +397,9 @@ class SpotCreateAPIView(CreateAPIView):
         with transaction.atomic():
             payment_method = serializer.validated_data.pop('payment_method')  # bu muhim!
             spot = serializer.save()
+            # yangi joy 'empty' - zona counteriga qo'shiladi
+            adjust_available(spot.zone_id, status_delta(None, spot.status))
+            spots_created([spot])
 
             reservation = Reservation.objects.create(
                 user_id=self.request.user,
@@ -231,6 +417,25 @@ class SpotCreateAPIView(CreateAPIView):
         return Response({'status': HTTPStatus.CREATED, 'message': serializer.data})
 
 
+@extend_schema(tags=['spots'], request=SpotAllocateSerializer)
+class SpotAllocateAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = SpotAllocateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            spot, reservation = allocate_spot(request.user, serializer.validated_data['zone'].pk,
+                                              serializer.validated_data['spot_type'])
+        except NoSpotAvailable:
+            return JsonResponse({'status': HTTPStatus.CONFLICT, 'message': "Bo'sh joy topilmadi!"},
+                                status=HTTPStatus.CONFLICT)
+        return Response({'status': HTTPStatus.CREATED, 'message': {
+            'spot': ParkingSpotSerializer(spot).data,
+            'reservation': ReservationSerializer(reservation).data,
+        }}, status=HTTPStatus.CREATED)
+
+
 @extend_schema(tags=['spots'], request=ParkingSpotSerializer)
 class SpotUpdateAPIView(UpdateAPIView):
     queryset = ParkingSpot.objects.all()
@@ -240,9 +445,12 @@ class SpotUpdateAPIView(UpdateAPIView):
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', False)
         instance = self.get_object()
+        old_zone_id, old_spot_type = instance.zone_id, instance.spot_type
         serializer = self.get_serializer(instance, data=request.data, partial=partial)
         serializer.is_valid(raise_exception=True)
-        self.perform_update(serializer)
+        with transaction.atomic():
+            self.perform_update(serializer)
+            relocate_spot(serializer.instance, old_zone_id, old_spot_type)
         return Response(serializer.data)
 
 
@@ -258,26 +466,160 @@ class SpotStatusAPIView(UpdateAPIView):
 
         if not new_status:
             return Response({"detail": "Status is required."}, status=HTTPStatus.BAD_REQUEST)
+        if new_status not in ParkingSpot.StatusChoices.values:
+            return Response({"detail": "Invalid status."}, status=HTTPStatus.BAD_REQUEST)
 
-        spot.status = new_status
-        spot.save()
+        change_spot_status(spot, new_status)
 
         serializer = self.get_serializer(spot)
         return Response(serializer.data, status=HTTPStatus.OK)
 
 
+@extend_schema(tags=['spots'])
+class SpotStatusBulkAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser, NDJSONParser]
+
+    def post(self, request, *args, **kwargs):
+        events = request.data
+        if not isinstance(events, list):
+            return JsonResponse({'status': HTTPStatus.BAD_REQUEST, 'message': "Eventlar ro'yxati kutilgan!"},
+                                status=HTTPStatus.BAD_REQUEST)
+        if getattr(settings, 'SENSOR_DEBOUNCE_SECONDS', 0):
+            # eventlar buferga tushadi va fon threadida siqilgan holda yoziladi
+            accepted = get_sensor_buffer().submit(events)
+            return JsonResponse({'status': HTTPStatus.ACCEPTED, 'message': accepted}, status=HTTPStatus.ACCEPTED)
+        stats = apply_status_events(events)
+        return JsonResponse({'status': HTTPStatus.OK, 'message': stats})
+
+
+@extend_schema(tags=['spots'])
+class SpotStatusBulkStatsAPIView(APIView):
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse({'status': HTTPStatus.OK, 'message': get_sensor_buffer().snapshot()})
+
+
+@extend_schema(tags=['spots'], parameters=[ChangeFeedQuerySerializer])
+class SpotChangesAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        query = ChangeFeedQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return JsonResponse({'status': HTTPStatus.BAD_REQUEST, 'message': query.errors}, status=HTTPStatus.BAD_REQUEST)
+        pages, cursor, has_more = changes_since(query.validated_data['since'], query.validated_data['limit'])
+        deleted = {'spots': [], 'zones': []}
+        for tombstone in pages['deleted']:
+            deleted[f'{tombstone.kind}s'].append(tombstone.object_id)
+        return JsonResponse({'status': HTTPStatus.OK, 'message': {
+            'spots': ParkingSpotChangeSerializer(pages['spots'], many=True).data,
+            'zones': ParkingZoneChangeSerializer(pages['zones'], many=True).data,
+            'deleted': deleted,
+            'next': cursor,
+            'has_more': has_more,
+        }})
+
+
+class SpotAvailabilityStreamView(View):
+    # Server-Sent Events: ?zones=1,2,3 bo'yicha joy holati o'zgarishlari; faqat ASGI (root/asgi.py) orqali ishlaydi
+    max_zones = 50
+
+    def authenticate(self, request):
+        authentication = CachedJWTAuthentication()
+        # brauzer EventSource header yubora olmaydi, shuning uchun ?token= ham qabul qilinadi
+        raw_token = request.GET.get('token')
+        try:
+            if raw_token:
+                return authentication.get_user(authentication.get_validated_token(raw_token))
+            result = authentication.authenticate(request)
+        except (InvalidToken, AuthenticationFailed):
+            return None
+        return result[0] if result else None
+
+    def snapshot(self, zone_ids):
+        zones = with_live_counters(ParkingZone.objects.filter(pk__in=zone_ids))
+        return {zone.pk: zone.live_available_spots for zone in zones}
+
+    async def get(self, request, *args, **kwargs):
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse({'status': HTTPStatus.NOT_IMPLEMENTED, 'message': "Stream faqat ASGI server orqali ishlaydi!"},
+                                status=HTTPStatus.NOT_IMPLEMENTED)
+        user = await sync_to_async(self.authenticate)(request)
+        if user is None:
+            return JsonResponse({'status': HTTPStatus.UNAUTHORIZED, 'message': "Token topilmadi!"},
+                                status=HTTPStatus.UNAUTHORIZED)
+        zone_ids = [int(zone) for zone in request.GET.get('zones', '').split(',') if zone.strip().isdigit()]
+        if not zone_ids or len(zone_ids) > self.max_zones:
+            return JsonResponse({'status': HTTPStatus.BAD_REQUEST, 'message': f"1-{self.max_zones} ta zone kerak!"},
+                                status=HTTPStatus.BAD_REQUEST)
+
+        response = StreamingHttpResponse(self.stream(zone_ids), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def stream(self, zone_ids):
+        subscriber = hub.subscribe(zone_ids)
+        queue = subscriber[1]
+        get_broker().listen()
+        heartbeat = getattr(settings, 'PUSH_HEARTBEAT_SECONDS', 15)
+        try:
+            snapshot = await sync_to_async(self.snapshot)(zone_ids)
+            yield f"event: snapshot\ndata: {json.dumps(snapshot)}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if event is RESYNC:
+                    # mijoz sekin o'qigan, deltalar tashlangan - holat qaytadan yuboriladi
+                    snapshot = await sync_to_async(self.snapshot)(zone_ids)
+                    yield f"event: snapshot\ndata: {json.dumps(snapshot)}\n\n"
+                    continue
+                yield f"event: availability\ndata: {json.dumps(event)}\n\n"
+        finally:
+            hub.unsubscribe(subscriber, zone_ids)
+
+
+class MetricsView(View):
+    # Prometheus text formati, barcha gunicorn workerlari bo'yicha yig'ilgan; ichki counterlar ochiq bo'lmasin
+
+    def allowed(self, request):
+        token = getattr(settings, 'METRICS_TOKEN', None)
+        if token:
+            return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+        return request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ['127.0.0.1', '::1'])
+
+    def get(self, request, *args, **kwargs):
+        if not self.allowed(request):
+            return HttpResponse(status=HTTPStatus.FORBIDDEN)
+        return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 #=================== Reservations =================
 
 @extend_schema(tags=['reservations'], request=ReservationSerializer)
 class ReservationListCreateAPIView(ListCreateAPIView):
-    queryset = Reservation.objects.all()
+    # spot_id/zone va user_id bitta JOIN bilan - sahifa hajmidan qat'i nazar so'rovlar soni o'zgarmaydi
+    queryset = Reservation.objects.select_related('spot_id__zone', 'user_id')
     serializer_class = ReservationSerializer
     permission_classes = [IsAuthenticated]
 
+    ordering = ('-start_time', '-id')
+
     def get(self, request, *args, **kwargs):
-        reservations = Reservation.objects.filter(user_id=request.user)
+        reservations = self.get_queryset().filter(user_id=request.user)
+        if wants_stream(request):
+            return stream_json_list(reservations.order_by(*self.ordering), ReservationSerializer,
+                                    envelope={'status': HTTPStatus.OK})
+        paginator = KeysetPagination()
+        reservations = paginator.paginate_queryset(reservations, request, self)
         serializer = ReservationSerializer(reservations, many=True)
-        return JsonResponse({'status': HTTPStatus.OK, 'data': serializer.data}, safe=False)
+        response = JsonResponse({'status': HTTPStatus.OK, 'data': serializer.data, 'next': paginator.next_cursor}, safe=False)
+        return paginator.add_headers(response)
 
     def post(self, request, *args, **kwargs):
         data = request.data
@@ -331,8 +673,10 @@ class ReservationCheckInAPIView(APIView):
             reservation = serializer.save(user_id=request.user)
             if reservation.status_total_amount != Reservation.StatusChoices.PENDING:
                 return Response({'status': HTTPStatus.BAD_REQUEST, 'message': "Faqat 'pending' holatda check-in bo‘ladi!"})
-            reservation.status_total_amount = Reservation.StatusChoices.ACTIVE
-            reservation.save()
+            with transaction.atomic():
+                reservation.status_total_amount = Reservation.StatusChoices.ACTIVE
+                reservation.save()
+                change_spot_status(reservation.spot_id, ParkingSpot.StatusChoices.OCCUPIED)
             return JsonResponse({'status': HTTPStatus.OK, 'message': "Check-in muvaffaqiyatli bajarildi!"})
 
 
@@ -343,23 +687,34 @@ class ReservationCheckOutAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, pk):
-        reservation = get_object_or_404(Reservation, pk=pk, user_id=request.user)
+        reservation = get_object_or_404(Reservation.objects.select_related('spot_id'), pk=pk, user_id=request.user)
         if reservation.status_total_amount != Reservation.StatusChoices.ACTIVE:
             return JsonResponse({'status': HTTPStatus.BAD_REQUEST, 'message': "Faqat 'active' holatda check-out bo‘ladi!"})
-        reservation.status_total_amount = Reservation.StatusChoices.COMPLETED
-        reservation.save()
+        with transaction.atomic():
+            reservation.status_total_amount = Reservation.StatusChoices.COMPLETED
+            reservation.save()
+            change_spot_status(reservation.spot_id, ParkingSpot.StatusChoices.EMPTY)
         return JsonResponse({'status': HTTPStatus.OK, 'message': "Check-out muvaffaqiyatli bajarildi!"})
 
 
 @extend_schema(tags=['payments'], request=PaymentSerializer)
 class PaymentListCreateAPIView(ListAPIView):
+    queryset = Payment.objects.select_related('reservation__spot_id__zone', 'user')
     serializer_class = PaymentSerializer
     permission_classes = [IsAuthenticated]
 
+    ordering = ('-created_at', '-id')
+
     def get(self, request, *args, **kwargs):
-        payments = Payment.objects.filter(user_id=request.user)
+        payments = self.get_queryset().filter(user_id=request.user)
+        if wants_stream(request):
+            return stream_json_list(payments.order_by(*self.ordering), PaymentSerializer,
+                                    envelope={'status': HTTPStatus.OK})
+        paginator = KeysetPagination()
+        payments = paginator.paginate_queryset(payments, request, self)
         serializer = PaymentSerializer(payments, many=True)
-        return JsonResponse({'status': HTTPStatus.OK, 'data': serializer.data}, safe=False)
+        response = JsonResponse({'status': HTTPStatus.OK, 'data': serializer.data, 'next': paginator.next_cursor}, safe=False)
+        return paginator.add_headers(response)
 
     def post(self, request, *args, **kwargs):
         data = request.data
@@ -374,7 +729,7 @@ class PaymentDetailAPIView(APIView):
     permission_classes = [IsAuthenticated]
     serializer_class = PaymentSerializer
     def get(self, request, pk, *args, **kwargs):
-        payment = get_object_or_404(Payment, pk=pk, user_id=request.user)
+        payment = get_object_or_404(Payment.objects.select_related('reservation', 'user'), pk=pk, user_id=request.user)
         serializer = PaymentSerializer(payment)
         return Response({'status': HTTPStatus.OK, 'message': serializer.data})
 